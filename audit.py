@@ -0,0 +1,206 @@
+"""Data-quality audit of completed reports
+
+Each rule is a SQL condition over the reports table. A batch of reports is
+checked against every rule in a single INSERT ... SELECT (one UNION ALL
+branch per rule), and each rule keeps its own high-water mark in
+audit_state, so re-running only looks at reports saved since the last run
+and a newly added rule back-fills the whole history. The rules are stored
+with their watermarks so DatabaseManager.update_report can re-check an
+edited report in the same transaction (supervisor corrections, patient
+merges); findings never go stale. Editing or removing a rule in the
+configuration drops its findings at the next run.
+
+Rule conditions are SQL and must come from a trusted configuration file.
+
+Usage: python audit.py [--db-file echo_reports.db] [--rules rules.json]
+"""
+import argparse
+import json
+
+# The app stores radio-button labels ('Impaired (more than mild)'), older data
+# and the API may store option values ('impaired'); LIKE is case-insensitive
+# and the conditions below match both forms.
+DEFAULT_RULES = [
+    {
+        'name': 'lv_impaired_without_level2',
+        'description': "LV function impaired but no Level 2 study requested",
+        'severity': 'error',
+        'condition': "lv_function LIKE 'impaired%' AND NOT COALESCE(requires_level2, 0)",
+    },
+    {
+        'name': 'valves_reported_without_a4c',
+        'description': "Apical 4 chamber view not obtained but MV/TV status reported",
+        'severity': 'warning',
+        'condition': "NOT COALESCE(view_a4c, 0) AND ("
+                     "(mv_status IS NOT NULL AND mv_status NOT LIKE 'unable%') OR "
+                     "(tv_status IS NOT NULL AND tv_status NOT LIKE 'unable%'))",
+    },
+    {
+        'name': 'significant_effusion_not_escalated',
+        'description': "Significant pericardial fluid but referring physician not informed",
+        'severity': 'error',
+        'condition': "pericardial_fluid LIKE 'significant%' AND NOT COALESCE(physician_informed, 0)",
+    },
+    {
+        'name': 'unapproved_training_report',
+        'description': "Training report has not been checked and approved",
+        'severity': 'warning',
+        'condition': "COALESCE(TRIM(training_approval), '') = ''",
+    },
+]
+
+
+class AuditRule:
+    def __init__(self, name, condition, description='', severity='warning'):
+        self.name = name
+        self.condition = condition
+        self.description = description
+        self.severity = severity
+
+    def __repr__(self):
+        return f"AuditRule({self.name!r})"
+
+
+def load_rules(path=None):
+    """Load rules from a JSON list of {name, condition, description, severity}"""
+    if path is None:
+        return [AuditRule(**rule) for rule in DEFAULT_RULES]
+    with open(path, 'r') as rules_file:
+        return [AuditRule(**rule) for rule in json.load(rules_file)]
+
+
+class AuditEngine:
+    def __init__(self, db, rules=None, batch_size=10000):
+        self.db = db
+        self.rules = rules if rules is not None else load_rules()
+        self.batch_size = batch_size
+
+    def run(self):
+        """Audit reports saved since the last run; returns the number of new findings
+
+        The configured rules replace the stored ones: findings of rules no
+        longer configured are deleted, and a rule whose condition changed is
+        re-run over every report.
+        """
+        with self.db._connection() as conn:
+            self._validate(conn)
+            self._sync_rules(conn)
+            if not self.rules:
+                conn.commit()
+                return 0
+            max_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM reports").fetchone()[0]
+            watermarks = self._watermarks(conn)
+            # Record the current rule definitions even when there is nothing new
+            self._save_state(conn, watermarks)
+            conn.commit()
+
+            found = 0
+            low = min(watermarks.values())
+            while low < max_id:
+                high = min(low + self.batch_size, max_id)
+                found += self._audit_batch(conn, watermarks, high)
+                for rule in self.rules:
+                    watermarks[rule.name] = max(watermarks[rule.name], high)
+                self._save_state(conn, watermarks)
+                conn.commit()
+                low = high
+            return found
+
+    def _sync_rules(self, conn):
+        """Drop stored state and findings that no longer match the configured
+        rules, so they are neither reported nor applied to edited reports"""
+        rules = {rule.name: rule for rule in self.rules}
+        stale = []
+        for rule_name, condition in conn.execute("SELECT rule_name, condition FROM audit_state"):
+            rule = rules.get(rule_name)
+            if rule is None or rule.condition != condition:
+                stale.append((rule_name,))
+        conn.executemany("DELETE FROM audit_findings WHERE rule_name = ?", stale)
+        conn.executemany("DELETE FROM audit_state WHERE rule_name = ?", stale)
+        conn.executemany(
+            "UPDATE audit_findings SET severity = ? WHERE rule_name = ? AND severity IS NOT ?",
+            [(rule.severity, rule.name, rule.severity) for rule in self.rules])
+
+    def _validate(self, conn):
+        names = [rule.name for rule in self.rules]
+        if len(set(names)) != len(names):
+            raise ValueError("Audit rule names must be unique")
+        for rule in self.rules:
+            try:
+                conn.execute(f"SELECT 1 FROM reports WHERE {rule.condition} LIMIT 0")
+            except Exception as e:
+                raise ValueError(f"Invalid condition for audit rule {rule.name!r}: {e}") from e
+
+    def _watermarks(self, conn):
+        stored = dict(conn.execute("SELECT rule_name, last_report_id FROM audit_state"))
+        return {rule.name: stored.get(rule.name, 0) for rule in self.rules}
+
+    def _save_state(self, conn, watermarks):
+        conn.executemany(
+            "INSERT OR REPLACE INTO audit_state (rule_name, last_report_id, severity, condition) "
+            "VALUES (?, ?, ?, ?)",
+            [(rule.name, watermarks[rule.name], rule.severity, rule.condition)
+             for rule in self.rules])
+
+    def _audit_batch(self, conn, watermarks, high):
+        branches, params = [], []
+        for rule in self.rules:
+            if watermarks[rule.name] >= high:
+                continue
+            branches.append(
+                "SELECT id, ?, ?, reporter_name FROM reports "
+                f"WHERE id > ? AND id <= ? AND ({rule.condition})")
+            params.extend([rule.name, rule.severity, watermarks[rule.name], high])
+        if not branches:
+            return 0
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO audit_findings (report_id, rule_name, severity, reporter_name) "
+            + " UNION ALL ".join(branches), params)
+        return cursor.rowcount
+
+    def get_findings(self, report_id=None):
+        """Stored findings, optionally for a single report"""
+        query = ("SELECT report_id, rule_name, severity, reporter_name, detected_at "
+                 "FROM audit_findings")
+        params = []
+        if report_id is not None:
+            query += " WHERE report_id = ?"
+            params.append(report_id)
+        query += " ORDER BY report_id, rule_name"
+        with self.db._connection() as conn:
+            conn.row_factory = self.db._dict_row_factory
+            return conn.execute(query, params).fetchall()
+
+    def summary_by_reporter(self):
+        """Finding counts per reporter and rule: {reporter: {rule: count}}"""
+        with self.db._connection() as conn:
+            rows = conn.execute("""
+            SELECT COALESCE(reporter_name, ''), rule_name, COUNT(*)
+            FROM audit_findings
+            GROUP BY 1, rule_name
+            ORDER BY 1, rule_name
+            """).fetchall()
+        summary = {}
+        for reporter_name, rule_name, count in rows:
+            summary.setdefault(reporter_name, {})[rule_name] = count
+        return summary
+
+
+def main():
+    from db_manager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Audit echo reports for inconsistencies")
+    parser.add_argument('--db-file', default='echo_reports.db')
+    parser.add_argument('--rules', help="JSON rule file (defaults to the built-in rules)")
+    args = parser.parse_args()
+
+    engine = AuditEngine(DatabaseManager(args.db_file), load_rules(args.rules))
+    print(f"New findings: {engine.run()}")
+    for reporter_name, counts in engine.summary_by_reporter().items():
+        print(f"{reporter_name or '(no reporter)'}:")
+        for rule_name, count in counts.items():
+            print(f"  {rule_name}: {count}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+"""Load test for report_api: requests/sec and tail latency against localhost
+
+By default starts the API in-process on a temporary database seeded with
+synthetic reports; pass --port to target an already running server instead.
+
+Usage: python bench_api_load.py [--requests 5000] [--concurrency 16]
+                                [--path /stats --path /reports?q=Patient]
+"""
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import tempfile
+import threading
+import time
+
+from bench_report_memory import populate
+from report_api import ReportAPI
+
+DEFAULT_PATHS = ['/stats', '/reports?limit=20', '/patients/000000001/reports', '/reports?q=Patient%201']
+
+
+async def client(host, port, paths, count, latencies, errors):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for index in range(count):
+            path = paths[index % len(paths)]
+            request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n\r\n".encode('latin-1')
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status_line = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                if name.lower() == 'content-length':
+                    length = int(value)
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+            if b' 200 ' not in status_line:
+                errors.append(status_line.decode('latin-1').strip())
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, paths, total, concurrency):
+    latencies, errors = [], []
+    per_client = [total // concurrency + (1 if i < total % concurrency else 0)
+                  for i in range(concurrency)]
+    started = time.perf_counter()
+    await asyncio.gather(*(client(host, port, paths, count, latencies, errors)
+                           for count in per_client if count))
+    return time.perf_counter() - started, latencies, errors
+
+
+def start_server(db_file, pool_size):
+    """Run the API on an ephemeral port in a background thread"""
+    api = ReportAPI(db_file, pool_size)
+    ready = threading.Event()
+    bound = {}
+
+    def on_ready(port):
+        bound['port'] = port
+        ready.set()
+
+    thread = threading.Thread(
+        target=lambda: asyncio.run(api.serve('127.0.0.1', 0, on_ready)), daemon=True)
+    thread.start()
+    ready.wait()
+    return api, bound['port']
+
+
+def percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--path', action='append', dest='paths')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, help="target a running server instead of starting one")
+    parser.add_argument('--rows', type=int, default=20000, help="synthetic reports to seed")
+    parser.add_argument('--pool-size', type=int, default=4)
+    args = parser.parse_args()
+    paths = args.paths or DEFAULT_PATHS
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        port = args.port
+        if port is None:
+            db_file = os.path.join(tmp_dir, 'bench_api.db')
+            api, port = start_server(db_file, args.pool_size)
+            populate(db_file, args.rows)
+            with sqlite3.connect(db_file) as conn:
+                conn.execute("ANALYZE")
+
+        elapsed, latencies, errors = asyncio.run(
+            run_load(args.host, port, paths, args.requests, args.concurrency))
+
+    latencies.sort()
+    print(f"{len(latencies):,} requests, concurrency {args.concurrency}, "
+          f"{len(latencies) / elapsed:,.0f} req/s")
+    print(f"latency ms: mean {statistics.mean(latencies) * 1000:.2f}, "
+          f"p50 {percentile(latencies, 0.50) * 1000:.2f}, "
+          f"p95 {percentile(latencies, 0.95) * 1000:.2f}, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.2f}, "
+          f"max {latencies[-1] * 1000:.2f}")
+    if errors:
+        print(f"{len(errors)} non-200 responses, e.g. {errors[0]}")
+
+
+if __name__ == '__main__':
+    main()
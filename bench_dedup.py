@@ -0,0 +1,108 @@
+"""Scale benchmark for dedup.py: blocking + scoring time and recall
+
+Generates reports for synthetic patients (about three reports each), gives a
+fraction of patients a near-duplicate identity (spelling variant, transposed
+MRN digits or swapped DOB day/month) and checks how many are found.
+
+Usage: python bench_dedup.py [--rows 1000000] [--duplicate-rate 0.02]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+from db_manager import DatabaseManager
+from dedup import DuplicateFinder
+
+FIRST_NAMES = ['james', 'mary', 'john', 'patricia', 'robert', 'jennifer', 'michael', 'linda',
+               'william', 'elizabeth', 'david', 'barbara', 'richard', 'susan', 'joseph', 'jessica',
+               'thomas', 'sarah', 'charles', 'karen', 'mohammed', 'fatima', 'wei', 'priya']
+LAST_NAMES = ['smith', 'jones', 'taylor', 'brown', 'williams', 'wilson', 'johnson', 'davies',
+              'robinson', 'wright', 'thompson', 'evans', 'walker', 'white', 'roberts', 'green',
+              'hall', 'wood', 'jackson', 'clarke', 'patel', 'khan', 'chen', 'okafor']
+
+
+def variant(rng, name, mrn, dob):
+    """A plausible mistyped copy of one patient identity"""
+    kind = rng.choice(['name', 'mrn', 'dob'])
+    if kind == 'name':
+        i = rng.randrange(1, len(name) - 1)
+        name = name[:i] + name[i + 1:] if rng.random() < 0.5 else name[:i] + name[i] + name[i:]
+    elif kind == 'mrn':
+        i = rng.randrange(len(mrn) - 1)
+        mrn = mrn[:i] + mrn[i + 1] + mrn[i] + mrn[i + 2:]
+    else:
+        day, month, year = dob.split('/')
+        dob = f"{month}/{day}/{year}"
+    return name, mrn, dob
+
+
+def populate(db_file, rows, duplicate_rate, seed=7):
+    rng = random.Random(seed)
+    patients = []
+    for _ in range(max(1, rows // 3)):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}".title()
+        mrn = f"{rng.randint(10**8, 10**9 - 1)}"
+        dob = f"{rng.randint(1, 12):02d}/{rng.randint(1, 12):02d}/{rng.randint(1930, 2005)}"
+        patients.append((name, mrn, dob))
+
+    duplicates = {}
+    for index in rng.sample(range(len(patients)), int(len(patients) * duplicate_rate)):
+        duplicates[index] = variant(rng, *patients[index])
+
+    def reports():
+        for _ in range(rows):
+            index = rng.randrange(len(patients))
+            identity = patients[index]
+            if index in duplicates and rng.random() < 0.3:
+                identity = duplicates[index]
+            yield identity
+
+    with sqlite3.connect(db_file) as conn:
+        conn.executemany("INSERT INTO reports (patient_name, mrn, dob) VALUES (?, ?, ?)", reports())
+        conn.commit()
+        present = set(conn.execute("SELECT DISTINCT patient_name, mrn, dob FROM reports"))
+    # Only duplicates where both identities made it into a report can be found
+    return {frozenset((patients[index], duplicate)) for index, duplicate in duplicates.items()
+            if duplicate != patients[index] and patients[index] in present and duplicate in present}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--duplicate-rate', type=float, default=0.02)
+    parser.add_argument('--threshold', type=float, default=0.85)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = os.path.join(tmp_dir, 'bench_dedup.db')
+        db = DatabaseManager(db_file)
+        print(f"Populating {args.rows:,} reports...")
+        expected = populate(db_file, args.rows, args.duplicate_rate)
+
+        finder = DuplicateFinder(db, args.threshold)
+        started = time.perf_counter()
+        patients = finder.load_patients()
+        loaded = time.perf_counter()
+        pairs = finder.candidate_pairs(patients)
+        blocked = time.perf_counter()
+        suggestions = finder.find()
+        finished = time.perf_counter()
+
+    found = {frozenset(((keep.name, keep.mrn, keep.dob), (merge.name, merge.mrn, merge.dob)))
+             for keep, merge, _, _ in suggestions}
+    all_pairs = len(patients) * (len(patients) - 1) // 2
+    print(f"{len(patients):,} distinct patients, {len(pairs):,} candidate pairs "
+          f"({len(pairs) / max(all_pairs, 1):.5%} of all pairs)")
+    print(f"load {loaded - started:.1f}s, blocking {blocked - loaded:.1f}s, "
+          f"full find (load + block + score) {finished - loaded:.1f}s")
+    true_positives = len(found & expected)
+    print(f"{len(suggestions):,} suggestions; recall {true_positives / max(len(expected), 1):.1%} "
+          f"of {len(expected):,} injected duplicates, "
+          f"precision {true_positives / max(len(found), 1):.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""Benchmark: ReportQuery vs. the ad-hoc query path
+
+Runs the same questions (date range, quality, reporter, level-2 referral)
+three ways: a hand-written method that builds its SQL and opens a
+connection per call, ReportQuery on DatabaseManager's persistent
+connection, and ReportQuery's SQL on one connection with the statement
+cache disabled vs. enabled. Also compares OFFSET with keyset paging through
+every match, and DatabaseManager.save_report with a connection per call
+(the previous behaviour) vs. the persistent per-thread connection.
+
+Usage: python bench_query.py [--rows 100000] [--repeat 200] [--page-size 100]
+                             [--inserts 2000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+
+from bench_report_memory import populate, synthetic_report
+from db_manager import STATEMENT_CACHE_SIZE, DatabaseManager, _where_clause
+from report_query import ReportQuery, _select_sql
+
+QUESTIONS = {
+    'date range': lambda query: query.between('date_created', '2022-03-01', '2022-04-01'),
+    'quality': lambda query: query.between('date_created', '2022-01-01', '2023-01-01')
+                                  .where(scan_quality='poor'),
+    'reporter': lambda query: query.where(reporter_name='Trainee')
+                                   .between('date_created', '2023-06-01', '2023-07-01'),
+    'level-2 referral': lambda query: query.where(requires_level2=True)
+                                           .between('date_created', '2024-01-01', '2024-02-01'),
+}
+
+
+def ad_hoc(db, filters, limit):
+    """What a hand-written DatabaseManager method does for the same question"""
+    conditions, params = [], []
+    start = end = None
+    for column, operator, values in filters:
+        if column == 'date_created':
+            if operator == '>=':
+                start = values[0]
+            else:
+                end = values[0]
+            continue
+        conditions.append(f"{column} {operator} ?")
+        params.extend(values)
+    where, params = _where_clause(start, end, conditions, params)
+    with db._connection() as conn:
+        conn.row_factory = db._dict_row_factory
+        return conn.execute(
+            f"SELECT * FROM reports {where} ORDER BY date_created, id LIMIT {int(limit)}",
+            params).fetchall()
+
+
+def timed(func, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def statement_cache(db_file, query, repeat, page_size):
+    shape, params = query._shape_and_params()
+    sql = _select_sql('main.reports', shape, False, False)
+    results = {}
+    for size in (0, STATEMENT_CACHE_SIZE):
+        conn = sqlite3.connect(db_file, cached_statements=size)
+        results[size] = timed(lambda: conn.execute(sql, params + [page_size]).fetchall(), repeat)
+        conn.close()
+    return results
+
+
+def offset_paging(db_file, query, page_size):
+    shape, params = query._shape_and_params()
+    sql = _select_sql('main.reports', shape, False, False).replace('LIMIT ?', 'LIMIT ? OFFSET ?')
+    conn = sqlite3.connect(db_file)
+    offset = pages = 0
+    while True:
+        rows = conn.execute(sql, params + [page_size, offset]).fetchall()
+        if not rows:
+            break
+        offset += len(rows)
+        pages += 1
+    conn.close()
+    return pages
+
+
+def keyset_paging(query, page_size):
+    pages, after = 0, None
+    while True:
+        reports, after = query.page(page_size, after)
+        pages += bool(reports)
+        if after is None:
+            return pages
+
+
+class PerCallDatabaseManager(DatabaseManager):
+    """The previous behaviour: a new connection and INSERT text on every call"""
+
+    @contextmanager
+    def _connection(self):
+        conn = sqlite3.connect(self.db_file)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _insert_report(cursor, report_data):
+        placeholders = ', '.join('?' * len(report_data))
+        columns = ', '.join(report_data.keys())
+        cursor.execute(f"INSERT INTO reports ({columns}) VALUES ({placeholders})",
+                       list(report_data.values()))
+
+
+def save_report_path(db_file, rows):
+    """Microseconds per db.save_report call, previous vs. current DatabaseManager"""
+    rng = random.Random(1)
+    reports = [synthetic_report(rng, index) for index in range(rows)]
+    results = {}
+    for name, manager in (('connection per call', PerCallDatabaseManager),
+                          ('persistent connection', DatabaseManager)):
+        db = manager(db_file)
+        started = time.perf_counter()
+        for report in reports:
+            db.save_report(report)
+        results[name] = (time.perf_counter() - started) / rows * 1e6
+        db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--inserts', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = os.path.join(tmp_dir, 'bench_query.db')
+        DatabaseManager(db_file)
+        print(f"Populating {args.rows:,} reports...")
+        populate(db_file, args.rows)
+
+        db = PerCallDatabaseManager(db_file)
+        current = DatabaseManager(db_file)
+
+        print(f"\nFirst page of {args.page_size}, mean ms per call over {args.repeat} calls")
+        print(f"{'question':<18}{'matches':>9}{'ad hoc':>9}{'builder':>9}"
+              f"{'no stmt cache':>15}{'stmt cache':>12}")
+        for name, build in QUESTIONS.items():
+            query = build(ReportQuery(current))
+            expected = ad_hoc(db, query._filters, args.page_size)
+            assert query.page(args.page_size)[0] == expected, name
+            ad_hoc_ms = timed(lambda: ad_hoc(db, query._filters, args.page_size), args.repeat)
+            builder_ms = timed(lambda: query.page(args.page_size), args.repeat)
+            cache = statement_cache(db_file, query, args.repeat, args.page_size)
+            print(f"{name:<18}{query.count():>9,}{ad_hoc_ms:>9.3f}{builder_ms:>9.3f}"
+                  f"{cache[0]:>15.3f}{cache[STATEMENT_CACHE_SIZE]:>12.3f}")
+
+        query = ReportQuery(current).where(scan_quality='good')
+        started = time.perf_counter()
+        pages = offset_paging(db_file, query, args.page_size)
+        offset_s = time.perf_counter() - started
+        started = time.perf_counter()
+        keyset_pages = keyset_paging(query, args.page_size)
+        keyset_s = time.perf_counter() - started
+        assert pages == keyset_pages
+        print(f"\nAll {pages:,} pages of scan_quality='good': "
+              f"OFFSET {offset_s:.2f}s, keyset {keyset_s:.2f}s")
+
+        started = time.perf_counter()
+        streamed = sum(len(batch) for batch in query.iter_batches(1000))
+        print(f"Streamed {streamed:,} matches in {time.perf_counter() - started:.2f}s")
+
+        print("\nsave_report, microseconds per report (one commit each):")
+        for name, per_report in save_report_path(db_file, args.inserts).items():
+            print(f"  {name:<24}{per_report:>8.1f}")
+        current.close()
+
+
+if __name__ == '__main__':
+    main()
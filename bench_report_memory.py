@@ -0,0 +1,108 @@
+"""Memory benchmark: bytes per report for dict rows vs. slot-based Report records
+
+Usage: python bench_report_memory.py [--rows N] [--db-file PATH]
+"""
+import argparse
+import gc
+import os
+import random
+import sqlite3
+import tempfile
+import time
+import tracemalloc
+
+from db_manager import DatabaseManager
+from report_model import REPORT_COLUMNS
+
+SIZE_OPTIONS = ['Normal size', 'Small cavity', 'Large cavity', 'Unable to assess']
+FUNCTION_OPTIONS = ['Normal movement', 'Impaired (more than mild)', 'Unable to assess']
+VALVE_OPTIONS = ['Normal', 'Heavily calcified/restricted opening',
+                 'Significant AR/valve prolapse', 'Unable to assess']
+
+
+def synthetic_report(rng, index):
+    return {
+        'date_created': f"20{rng.randint(20, 24)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 10:00:00",
+        'patient_name': f"Patient {index}",
+        'mrn': f"{rng.randint(0, 10**9):09d}",
+        'dob': f"{rng.randint(1, 28):02d}/{rng.randint(1, 12):02d}/{rng.randint(1930, 2005)}",
+        'gender': rng.choice(['M', 'F']),
+        'scan_indication': 'Shortness of breath',
+        'scan_quality': rng.choice(['teaching', 'good', 'adequate', 'poor']),
+        'quality_comments': '',
+        'view_psax': True, 'view_plax': True, 'view_a4c': rng.random() < 0.9,
+        'view_a5c': rng.random() < 0.5, 'view_subx': rng.random() < 0.7,
+        'lv_size': rng.choice(SIZE_OPTIONS),
+        'lvidd': round(rng.uniform(3.5, 6.5), 1),
+        'lv_function': rng.choice(FUNCTION_OPTIONS),
+        'wall_motion_abnormality': rng.random() < 0.1,
+        'rv_size': rng.choice(['Normal', 'Small cavity', 'Enlarged', 'Unable to assess']),
+        'tapse': round(rng.uniform(10, 28), 1),
+        'septum_shape': 'Mid-systolic reversal (normal)',
+        'av_status': rng.choice(VALVE_OPTIONS),
+        'mv_status': rng.choice(VALVE_OPTIONS),
+        'tv_status': rng.choice(VALVE_OPTIONS),
+        'aortic_root': rng.choice(['Visually normal size', 'Dilated']),
+        'ivc': 'Normal movement with respiration',
+        'pericardial_fluid': rng.choice(['No pericardial fluid seen', 'Trivial']),
+        'pleural_effusion': rng.choice(['Present', 'Not Present']),
+        'additional_observations': '',
+        'clinical_conclusion': 'Normal biventricular size and function.',
+        'requires_level2': rng.random() < 0.2,
+        'physician_informed': rng.random() < 0.8,
+        'training_approval': 'Dr Supervisor',
+        'reporter_name': 'Trainee',
+        'training_status': 'Level 1 trainee',
+    }
+
+
+def populate(db_file, rows, batch_size=10000):
+    rng = random.Random(42)
+    columns = [column for column in REPORT_COLUMNS if column not in ('id', 'version')]
+    sql = f"INSERT INTO reports ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+    with sqlite3.connect(db_file) as conn:
+        for start in range(0, rows, batch_size):
+            batch = (synthetic_report(rng, index)
+                     for index in range(start, min(rows, start + batch_size)))
+            conn.executemany(sql, ([report.get(column) for column in columns] for report in batch))
+        conn.commit()
+
+
+def measure(db, as_records):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    reports = db.get_reports(as_records=as_records)
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(reports)
+    del reports
+    return count, current, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--db-file', help="existing database to load instead of synthetic data")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = args.db_file
+        if db_file is None:
+            db_file = os.path.join(tmp_dir, 'bench_reports.db')
+            db = DatabaseManager(db_file)
+            print(f"Populating {args.rows:,} synthetic reports...")
+            populate(db_file, args.rows)
+        else:
+            db = DatabaseManager(db_file)
+
+        for label, as_records in (('dict', False), ('Report', True)):
+            count, total_bytes, elapsed = measure(db, as_records)
+            print(f"{label:>7}: {count:,} rows, {total_bytes / 2**20:,.1f} MiB, "
+                  f"{total_bytes / max(count, 1):,.0f} bytes/report, loaded in {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
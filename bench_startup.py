@@ -0,0 +1,89 @@
+"""Cold-start benchmark: import time of the app modules against a budget
+
+Each run imports the module in a fresh interpreter with ``-X importtime`` and
+reads the cumulative time of the top-level import. Also times opening a new
+and an existing database with DatabaseManager. Exits non-zero when the median
+import time exceeds the budget.
+
+Usage: python bench_startup.py [--module echo_app] [--budget-ms 400] [--runs 5]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def parse_importtime(stderr):
+    """Return [(cumulative_us, self_us, name)] from ``-X importtime`` output"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        imports.append((int(cumulative_us), int(self_us), name.rstrip()))
+    return imports
+
+
+def time_import(module):
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=HERE, capture_output=True, text=True)
+    if result.returncode != 0:
+        last_line = result.stderr.strip().splitlines()[-1]
+        raise SystemExit(f"import {module} failed: {last_line}")
+    imports = parse_importtime(result.stderr)
+    total_us = next(cumulative for cumulative, _, name in imports if name.strip() == module)
+    return total_us, imports
+
+
+def time_database_open():
+    # Imported here so the measurement above is not affected
+    from db_manager import DatabaseManager
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = os.path.join(tmp_dir, 'startup.db')
+        timings = []
+        for _ in range(2):
+            started = time.perf_counter()
+            DatabaseManager(db_file)
+            timings.append((time.perf_counter() - started) * 1000)
+        return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--module', default='echo_app')
+    parser.add_argument('--budget-ms', type=float, default=400.0)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help="slowest imports to list")
+    args = parser.parse_args()
+
+    totals, slowest = [], None
+    for _ in range(args.runs):
+        total_us, imports = time_import(args.module)
+        totals.append(total_us / 1000)
+        slowest = imports
+    median_ms = statistics.median(totals)
+
+    print(f"import {args.module}: median {median_ms:.1f} ms over {args.runs} runs "
+          f"(min {min(totals):.1f}, max {max(totals):.1f})")
+    print("Slowest imports (cumulative, last run):")
+    for cumulative_us, self_us, name in sorted(slowest, reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name.strip()}")
+
+    created_ms, reopened_ms = time_database_open()
+    print(f"DatabaseManager: new database {created_ms:.1f} ms, existing database {reopened_ms:.1f} ms")
+
+    if median_ms > args.budget_ms:
+        print(f"FAIL: import time {median_ms:.1f} ms exceeds budget {args.budget_ms:.1f} ms")
+        sys.exit(1)
+    print(f"OK: within budget of {args.budget_ms:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
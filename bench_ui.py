@@ -0,0 +1,162 @@
+"""Headless UI performance harness for EchoReportApp
+
+Runs on Qt's offscreen platform, so it needs no display. Times window
+construction (per tab), filling in each of the six report tabs, queueing
+the save and flushing it to the database, while a StallWatchdog records
+any event-loop stalls. Exits non-zero if the median end-to-end time for one
+report exceeds --budget-ms or any stall exceeds --stall-ms.
+
+Usage: python bench_ui.py [--iterations 20] [--budget-ms 500] [--stall-ms 200]
+"""
+import os
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import argparse
+import contextlib
+import io
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+from PyQt6.QtWidgets import QApplication
+
+import echo_app
+from ui_watchdog import StallWatchdog
+
+TAB_BUILDERS = ('create_scan_quality_tab', 'create_patient_info_tab', 'create_ventricular_tab',
+                'create_valve_tab', 'create_other_findings_tab', 'create_conclusions_tab',
+                'create_duplicates_tab')
+
+TAB_FILLERS = ('fill_scan_details', 'fill_patient_info', 'fill_ventricular',
+               'fill_valves', 'fill_other_findings', 'fill_conclusions')
+
+
+def timed(name, timings, func):
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            timings[name].append((time.perf_counter() - started) * 1000)
+    return wrapper
+
+
+def pick(button_group, iteration):
+    buttons = button_group.buttons()
+    buttons[iteration % len(buttons)].setChecked(True)
+
+
+def fill_scan_details(window, iteration):
+    window.indication_text.setPlainText(f"Breathlessness, query LV function (run {iteration})")
+    for index, checkbox in enumerate(window.view_checkboxes.values()):
+        checkbox.setChecked((index + iteration) % 3 != 0)
+    buttons = list(window.quality_buttons.values())
+    buttons[iteration % len(buttons)].setChecked(True)
+    window.quality_comments.setText("Limited apical windows")
+
+
+def fill_patient_info(window, iteration):
+    window.patient_name.setText(f"Test Patient {iteration}")
+    window.mrn.setText(f"{900000000 + iteration}")
+    window.gender.setText("F" if iteration % 2 else "M")
+
+
+def fill_ventricular(window, iteration):
+    for group in (window.lv_size_buttons, window.lv_function_buttons,
+                  window.septum_buttons, window.rv_size_buttons):
+        pick(group, iteration)
+    window.lvidd_input.setText("4.8")
+    window.tapse_input.setText("19")
+    window.wall_motion_check.setChecked(iteration % 5 == 0)
+
+
+def fill_valves(window, iteration):
+    for group in (window.av_buttons, window.mv_buttons, window.tv_buttons):
+        pick(group, iteration)
+
+
+def fill_other_findings(window, iteration):
+    for group in (window.aortic_root_buttons, window.ivc_buttons,
+                  window.pericardial_buttons, window.pleural_buttons):
+        pick(group, iteration)
+    window.observations_text.setText("Nil else of note")
+
+
+def fill_conclusions(window, iteration):
+    window.conclusions_text.setPlainText("Normal biventricular size and function. " * 5)
+    window.approval_input.setText("Dr Supervisor")
+    for group in (window.level2_buttons, window.physician_buttons):
+        pick(group, iteration)
+    window.name_input.setText("Trainee")
+    window.training_status_input.setText("Level 1")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--budget-ms', type=float, default=500.0)
+    parser.add_argument('--stall-ms', type=float, default=200.0)
+    args = parser.parse_args()
+
+    timings = defaultdict(list)
+    for name in TAB_BUILDERS:
+        setattr(echo_app.EchoReportApp, name,
+                timed(name, timings, getattr(echo_app.EchoReportApp, name)))
+
+    app = QApplication(sys.argv)
+    watchdog = StallWatchdog(args.stall_ms).start()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        started = time.perf_counter()
+        window = echo_app.EchoReportApp(os.path.join(tmp_dir, 'ui_bench.db'),
+                                        os.path.join(tmp_dir, 'outbox.jsonl'))
+        window.show()
+        app.processEvents()
+        timings['window construction'].append((time.perf_counter() - started) * 1000)
+        # Drive the flush from here so it is timed rather than racing the background thread
+        window.flusher.stop()
+
+        fillers = [globals()[name] for name in TAB_FILLERS]
+        for iteration in range(args.iterations):
+            report_started = time.perf_counter()
+            for index, (name, filler) in enumerate(zip(TAB_FILLERS, fillers)):
+                started = time.perf_counter()
+                window.tabs.setCurrentIndex(index)
+                filler(window, iteration)
+                app.processEvents()
+                timings[name].append((time.perf_counter() - started) * 1000)
+
+            # The app echoes every saved field to stdout; keep the report readable
+            with contextlib.redirect_stdout(io.StringIO()):
+                timed('save_report (queue)', timings, window.save_report)()
+                timed('flush to database', timings, window.flusher.flush)()
+            app.processEvents()
+            timings['report end-to-end'].append((time.perf_counter() - report_started) * 1000)
+
+        window.close()
+        app.processEvents()
+        watchdog.stop()
+
+    print(f"\n{'step':<28}{'median ms':>10}{'max ms':>10}{'runs':>6}")
+    for name, values in timings.items():
+        print(f"{name:<28}{statistics.median(values):>10.2f}{max(values):>10.2f}{len(values):>6}")
+
+    failed = False
+    for stall in watchdog.stalls:
+        print(f"\nStall of {stall.duration_ms or 0:.0f} ms in:\n{stall.stack}")
+        failed = True
+    median_ms = statistics.median(timings['report end-to-end'])
+    if median_ms > args.budget_ms:
+        print(f"FAIL: median report time {median_ms:.1f} ms exceeds budget {args.budget_ms:.1f} ms")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print(f"\nOK: median report {median_ms:.1f} ms within {args.budget_ms:.1f} ms, no stalls "
+          f"over {args.stall_ms:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,49 +1,452 @@
+import json
+import os
+import queue
 import sqlite3
-from datetime import datetime
+import threading
+import weakref
+import zlib
+from contextlib import contextmanager
+from datetime import date, datetime
+from functools import lru_cache
+
+from report_model import REPORT_COLUMNS, Report
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schema.sql')
+
+# Bump whenever schema.sql changes so existing databases re-run the DDL
+SCHEMA_VERSION = 9
+
+# Free-text columns that are zlib-compressed when a report is moved to an archive
+ARCHIVE_TEXT_COLUMNS = (
+    'scan_indication', 'quality_comments',
+    'additional_observations', 'clinical_conclusion'
+)
+
+# Columns added after the first release: (table, column, definition)
+ADDED_COLUMNS = (
+    ('reports', 'version', 'INTEGER NOT NULL DEFAULT 1'),
+    ('audit_state', 'severity', 'TEXT'),
+    ('audit_state', 'condition', 'TEXT'),
+    ('patient_merge_suggestions', 'pair_key', 'TEXT'),
+)
+
+# Columns an edit may change
+UPDATABLE_COLUMNS = frozenset(REPORT_COLUMNS) - {'id', 'date_created', 'version'}
+
+# Prepared statements kept per connection: the fixed queries here plus the
+# shapes ReportQuery generates (the sqlite3 default is 128)
+STATEMENT_CACHE_SIZE = 256
+
+
+class ReportNotFoundError(LookupError):
+    pass
+
+
+class ArchivedReportError(Exception):
+    """The report has been moved to a read-only archive store"""
+
+    def __init__(self, report_id):
+        super().__init__(f"Report {report_id} is archived and can no longer be edited")
+        self.report_id = report_id
+
+
+class ConcurrentUpdateError(Exception):
+    """The report changed since the caller read it"""
+
+    def __init__(self, report_id, expected_version, current_version):
+        super().__init__(
+            f"Report {report_id} is at version {current_version}, "
+            f"not the expected version {expected_version}")
+        self.report_id = report_id
+        self.expected_version = expected_version
+        self.current_version = current_version
+
+
+def _timestamp(value):
+    """Normalise a date, datetime or ISO string to the date_created text format"""
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(value, date):
+        return value.strftime('%Y-%m-%d')
+    return str(value)
+
+
+def _where_clause(start_date=None, end_date=None, conditions=(), params=()):
+    """WHERE clause for a [start_date, end_date) range plus extra conditions"""
+    start, end = _timestamp(start_date), _timestamp(end_date)
+    conditions, params = list(conditions), list(params)
+    if start is not None:
+        conditions.append("date_created >= ?")
+        params.append(start)
+    if end is not None:
+        conditions.append("date_created < ?")
+        params.append(end)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return where, params
+
+
+# (description, column names, indexes of ARCHIVE_TEXT_COLUMNS) for the last
+# statement a row factory saw. sqlite3 keeps one description per executed
+# statement, and holding it here means its identity can't be reused.
+_last_columns = (None, (), ())
+
+
+def _row_columns(cursor):
+    """Column names of the cursor's current statement, and the indexes of the
+    compressed free-text columns among them, worked out once per statement
+    instead of for every row"""
+    global _last_columns
+    description = cursor.description
+    cached = _last_columns
+    if cached[0] is not description:
+        columns = tuple(column[0] for column in description)
+        compressed = tuple(index for index, column in enumerate(columns)
+                           if column in ARCHIVE_TEXT_COLUMNS)
+        cached = _last_columns = (description, columns, compressed)
+    return cached[1], cached[2]
+
+
+def _archive_years(start_date=None, end_date=None):
+    """First and last archive year a [start_date, end_date) range touches
+    (None for an open end)"""
+    start, end = _timestamp(start_date), _timestamp(end_date)
+    first = int(start[:4]) if start is not None else None
+    last = None
+    if end is not None:
+        last = int(end[:4])
+        if end <= f"{last:04d}-01-01":
+            # Even a report dated 1 January of that year is past the exclusive end
+            last -= 1
+    return first, last
+
+
+@lru_cache(maxsize=1)
+def _schema_script():
+    with open(SCHEMA_FILE, 'r') as schema_file:
+        return schema_file.read()
+
+
+@lru_cache(maxsize=64)
+def _insert_sql(columns):
+    """INSERT for a tuple of report columns, built once per column set"""
+    return f"INSERT INTO reports ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+
+
+def _compress_text(value):
+    if value is None or isinstance(value, bytes):
+        return value
+    return zlib.compress(str(value).encode('utf-8'))
+
+
+def _decompress_text(value):
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections that may be used from worker threads
+
+    Connections are opened lazily up to `size`; callers block until one is
+    free. Each connection is only ever used by one thread at a time.
+    """
+
+    def __init__(self, db_file, size=4, timeout=30.0):
+        self.db_file = db_file
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._slots = queue.Queue()
+        for _ in range(size):
+            self._slots.put(None)
+
+    def acquire(self):
+        try:
+            self._slots.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No database connection free after {self.timeout:g}s") from None
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            conn = sqlite3.connect(self.db_file, timeout=self.timeout, check_same_thread=False,
+                                   cached_statements=STATEMENT_CACHE_SIZE)
+        except BaseException:
+            # e.g. the shared drive is offline; don't leak the slot
+            self._slots.put(None)
+            raise
+        self._opened += 1
+        return conn
+
+    def release(self, conn):
+        conn.row_factory = None
+        self._idle.put(conn)
+        self._slots.put(None)
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class _ConnectionOwner:
+    """Weak-referenceable marker stored in a thread's local data"""
+
 
 class DatabaseManager:
     def __init__(self, db_file='echo_reports.db'):
         self.db_file = db_file
+        self._local = threading.local()
+        self._opened = []
+        self._opened_lock = threading.Lock()
         self.setup_database()
 
     def setup_database(self):
         """Create the database and tables if they don't exist"""
-        with sqlite3.connect(self.db_file) as conn:
-            with open('schema.sql', 'r') as schema_file:
-                conn.executescript(schema_file.read())
+        with self._connection() as conn:
+            self._create_schema(conn)
+
+    @contextmanager
+    def _connection(self):
+        """Connection for a single operation, committed on success
+
+        Each thread keeps one connection open until it ends, so its statement
+        cache survives between calls. A nested call (e.g. while a streaming
+        iterator holds the connection) gets a short-lived one instead, and a
+        connection that raised a database error is reopened next time.
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.in_use:
+            nested = conn is not None
+            conn = sqlite3.connect(self.db_file, cached_statements=STATEMENT_CACHE_SIZE,
+                                   check_same_thread=False)
+            if nested:
+                try:
+                    with conn:
+                        yield conn
+                finally:
+                    conn.close()
+                return
+            self._local.conn = conn
+            # Thread-local data is dropped when its thread ends, which closes
+            # the connection; one-off worker threads don't leak file handles
+            self._local.owner = _ConnectionOwner()
+            weakref.finalize(self._local.owner, self._close_connection, conn)
+            with self._opened_lock:
+                self._opened.append(conn)
+
+        self._local.in_use = True
+        try:
+            with conn:
+                yield conn
+        except sqlite3.DatabaseError:
+            # e.g. the shared drive went away; reconnect on the next call
+            self._local.conn = self._local.owner = None
+            self._close_connection(conn)
+            raise
+        finally:
+            conn.row_factory = None
+            self._local.in_use = False
+
+    def _close_connection(self, conn):
+        with self._opened_lock:
+            if conn in self._opened:
+                self._opened.remove(conn)
+        conn.close()
+
+    def close(self):
+        """Close the connections held by every thread"""
+        with self._opened_lock:
+            opened, self._opened = self._opened, []
+        for conn in opened:
+            conn.close()
+        self._local = threading.local()
+
+    def _create_schema(self, conn):
+        """Run the DDL unless the database is already at SCHEMA_VERSION"""
+        if conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION:
+            return
+        for table, column, definition in ADDED_COLUMNS:
+            columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if columns and column not in columns:
+                # Databases created before the column existed. Added before
+                # the script runs, as its indexes may use the column.
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        conn.executescript(_schema_script())
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
     def save_report(self, report_data):
         """Save a new report to the database"""
-        with sqlite3.connect(self.db_file) as conn:
+        with self._connection() as conn:
             cursor = conn.cursor()
-            
-            # Convert the report data dictionary to SQL insert
-            placeholders = ', '.join('?' * len(report_data))
-            columns = ', '.join(report_data.keys())
-            sql = f"INSERT INTO reports ({columns}) VALUES ({placeholders})"
-            
-            cursor.execute(sql, list(report_data.values()))
+            self._insert_report(cursor, report_data)
             conn.commit()
             return cursor.lastrowid
 
-    def get_scans_completed(self):
-        """Get total number of scans completed"""
-        with sqlite3.connect(self.db_file) as conn:
+    def save_reports(self, entries):
+        """Save (idempotency_key, report_data) pairs in one transaction
+
+        Keys already recorded in saved_reports are skipped, so replaying a
+        batch never duplicates reports. Returns {key: report_id} for the
+        reports inserted by this call.
+        """
+        saved = {}
+        with self._connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM reports")
-            return cursor.fetchone()[0]
+            for key, report_data in entries:
+                cursor.execute(
+                    "INSERT OR IGNORE INTO saved_reports (idempotency_key) VALUES (?)", (key,))
+                if cursor.rowcount == 0:
+                    continue
+                self._insert_report(cursor, report_data)
+                saved[key] = cursor.lastrowid
+                cursor.execute(
+                    "UPDATE saved_reports SET report_id = ? WHERE idempotency_key = ?",
+                    (saved[key], key))
+            conn.commit()
+        return saved
+
+    @staticmethod
+    def _insert_report(cursor, report_data):
+        # The same column set gives the same SQL text, so the prepared statement is reused
+        cursor.execute(_insert_sql(tuple(report_data)), list(report_data.values()))
+
+    def update_report(self, report_id, changes, expected_version, revised_by=None):
+        """Apply changes to a report if it is still at expected_version
+
+        Only columns whose value actually changes are recorded: the revision
+        row stores their previous values, so the current row plus the
+        revisions newer than a version are enough to rebuild it. Returns the
+        new version number.
+        """
+        invalid = sorted(set(changes) - UPDATABLE_COLUMNS)
+        if invalid:
+            raise ValueError(f"Cannot update columns: {', '.join(invalid)}")
+
+        with self._connection() as conn:
+            # Take the write lock before reading so the compare-and-set is atomic
+            conn.execute("BEGIN IMMEDIATE")
+            columns = list(changes)
+            row = conn.execute(
+                f"SELECT {', '.join(['version'] + columns)} FROM reports WHERE id = ?",
+                (report_id,)).fetchone()
+            if row is None:
+                # Archives cannot be attached inside the transaction
+                conn.rollback()
+                if self._archived_report(conn, report_id) is not None:
+                    raise ArchivedReportError(report_id)
+                raise ReportNotFoundError(f"Report {report_id} not found")
+            current_version = row[0]
+            if current_version != expected_version:
+                raise ConcurrentUpdateError(report_id, expected_version, current_version)
+
+            previous = {column: value for column, value in zip(columns, row[1:])
+                        if value != changes[column]}
+            if not previous:
+                return current_version
+
+            new_version = current_version + 1
+            assignments = ', '.join(f"{column} = ?" for column in previous)
+            conn.execute(
+                f"UPDATE reports SET {assignments}, version = ? WHERE id = ? AND version = ?",
+                [changes[column] for column in previous] + [new_version, report_id, current_version])
+            conn.execute(
+                "INSERT INTO report_revisions (report_id, version, revised_by, previous_values) "
+                "VALUES (?, ?, ?, ?)",
+                (report_id, new_version, revised_by, json.dumps(previous)))
+            self._reaudit_report(conn, report_id)
+            conn.commit()
+            return new_version
+
+    @staticmethod
+    def _reaudit_report(conn, report_id):
+        """Re-run the audit rules that have already checked this report
+        (see audit.AuditEngine), so its findings match the edited values"""
+        rules = conn.execute(
+            "SELECT rule_name, severity, condition FROM audit_state "
+            "WHERE last_report_id >= ? AND condition IS NOT NULL", (report_id,)).fetchall()
+        for rule_name, severity, condition in rules:
+            conn.execute("DELETE FROM audit_findings WHERE report_id = ? AND rule_name = ?",
+                         (report_id, rule_name))
+            conn.execute(
+                "INSERT INTO audit_findings (report_id, rule_name, severity, reporter_name) "
+                f"SELECT id, ?, ?, reporter_name FROM reports WHERE id = ? AND ({condition})",
+                (rule_name, severity, report_id))
+
+    def get_report(self, report_id, version=None):
+        """Get one report as a dictionary, optionally as it was at an earlier version
+
+        Archived reports are found too; their revisions stay in the hot store.
+        """
+        with self._connection() as conn:
+            conn.row_factory = self._dict_row_factory
+            report = conn.execute("SELECT * FROM reports WHERE id = ?", (report_id,)).fetchone()
+            if report is None:
+                report = self._archived_report(conn, report_id)
+            if report is None:
+                raise ReportNotFoundError(f"Report {report_id} not found")
+            if version is None or version == report['version']:
+                return report
+            if not 1 <= version < report['version']:
+                raise ReportNotFoundError(f"Report {report_id} has no version {version}")
+
+            # Undo newer revisions, newest first
+            revisions = conn.execute(
+                "SELECT version, previous_values FROM report_revisions "
+                "WHERE report_id = ? AND version > ? ORDER BY version DESC",
+                (report_id, version)).fetchall()
+            for revision in revisions:
+                report.update(json.loads(revision['previous_values']))
+            report['version'] = version
+            return report
+
+    def get_report_history(self, report_id):
+        """Revisions of a report, oldest first, with the columns each one changed"""
+        with self._connection() as conn:
+            rows = conn.execute(
+                "SELECT version, revised_at, revised_by, previous_values FROM report_revisions "
+                "WHERE report_id = ? ORDER BY version", (report_id,)).fetchall()
+            if not rows and conn.execute(
+                    "SELECT 1 FROM reports WHERE id = ?", (report_id,)).fetchone() is None:
+                if self._archived_report(conn, report_id) is None:
+                    raise ReportNotFoundError(f"Report {report_id} not found")
+        return [
+            {'version': version, 'revised_at': revised_at, 'revised_by': revised_by,
+             'changed_columns': sorted(json.loads(previous_values))}
+            for version, revised_at, revised_by, previous_values in rows
+        ]
+
+    def get_scans_completed(self, start_date=None, end_date=None):
+        """Get total number of scans completed"""
+        with self._connection() as conn:
+            results = self._query_stores(
+                conn, "SELECT COUNT(*) FROM {source} {where}", start_date, end_date)
+            return sum(rows[0][0] for rows in results)
 
     def get_scans_remaining(self, target=75):
         """Calculate remaining scans needed"""
         completed = self.get_scans_completed()
         return max(0, target - completed)
 
-    def get_pathology_summary(self):
+    def get_pathology_summary(self, start_date=None, end_date=None):
         """Get summary of pathological findings"""
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
+        with self._connection() as conn:
             query = """
-            SELECT 
+            SELECT
                 COUNT(CASE WHEN lv_size != 'normal' OR lv_function != 'normal' THEN 1 END) as lv_abnormal,
                 COUNT(CASE WHEN rv_size != 'normal' OR rv_function != 'normal' THEN 1 END) as rv_abnormal,
                 COUNT(CASE WHEN av_status != 'normal' THEN 1 END) as av_abnormal,
@@ -52,28 +455,244 @@ class DatabaseManager:
                 COUNT(CASE WHEN aortic_root = 'dilated' THEN 1 END) as aortic_root_dilated,
                 COUNT(CASE WHEN pericardial_fluid IN ('significant', 'trivial') THEN 1 END) as pericardial_effusion,
                 COUNT(CASE WHEN pleural_effusion = 'Present' THEN 1 END) as pleural_effusion
-            FROM reports
+            FROM {source}
+            {where}
             """
-            cursor.execute(query)
+            results = self._query_stores(conn, query, start_date, end_date)
+            totals = [sum(counts) for counts in zip(*(rows[0] for rows in results))]
             return dict(zip([
                 'LV abnormality', 'RV abnormality', 'AV abnormality',
                 'MV abnormality', 'TV abnormality', 'Dilated aortic root',
                 'Pericardial effusion', 'Pleural effusion'
-            ], cursor.fetchone()))
+            ], totals))
 
-    def get_quality_trends(self):
+    def get_quality_trends(self, start_date=None, end_date=None):
         """Get scan quality trends"""
-        with sqlite3.connect(self.db_file) as conn:
-            cursor = conn.cursor()
+        with self._connection() as conn:
             query = """
-            SELECT 
+            SELECT
                 strftime('%Y-%m', date_created) as month,
                 scan_quality,
                 COUNT(*) as count
-            FROM reports
+            FROM {source}
+            {where}
             GROUP BY month, scan_quality
             ORDER BY month
             """
-            cursor.execute(query)
-            return cursor.fetchall()
-        
\ No newline at end of file
+            counts = {}
+            for rows in self._query_stores(conn, query, start_date, end_date):
+                for month, scan_quality, count in rows:
+                    key = (month, scan_quality)
+                    counts[key] = counts.get(key, 0) + count
+            return sorted(((month, quality, count) for (month, quality), count in counts.items()),
+                          key=lambda row: row[0] or '')
+
+    def get_reports(self, start_date=None, end_date=None, as_records=False):
+        """Get full reports, oldest first, as dictionaries or compact Report records"""
+        with self._connection() as conn:
+            conn.row_factory = self.report_row_factory if as_records else self._dict_row_factory
+            results = self._query_stores(
+                conn, "SELECT * FROM {source} {where}", start_date, end_date)
+            reports = [report for rows in results for report in rows]
+            if as_records:
+                reports.sort(key=lambda report: (report.date_created or '', report.id))
+            else:
+                reports.sort(key=lambda report: (report['date_created'] or '', report['id']))
+            return reports
+
+    def iter_report_batches(self, batch_size=1000, start_date=None, end_date=None):
+        """Stream reports as lists of dictionaries without loading them all
+
+        Each store (hot, then archives the range needs) is read in id order
+        with fetchmany, so memory use is bounded by batch_size.
+        """
+        where, params = _where_clause(start_date, end_date)
+        with self._connection() as conn:
+            stores = ['main'] + [
+                archive_path for archive_path in self._archives_for_range(conn, start_date, end_date)
+                if os.path.exists(archive_path)]
+            for store in stores:
+                if store != 'main':
+                    conn.execute("ATTACH DATABASE ? AS archive", (store,))
+                schema = 'main' if store == 'main' else 'archive'
+                try:
+                    cursor = conn.cursor()
+                    cursor.row_factory = self._dict_row_factory
+                    cursor.execute(f"SELECT * FROM {schema}.reports {where} ORDER BY id", params)
+                    while True:
+                        batch = cursor.fetchmany(batch_size)
+                        if not batch:
+                            break
+                        yield batch
+                    cursor.close()
+                finally:
+                    if store != 'main':
+                        conn.execute("DETACH DATABASE archive")
+
+    def search_reports(self, text=None, reporter_name=None, start_date=None,
+                       end_date=None, limit=100):
+        """Search reports by free text and/or reporter, newest first"""
+        conditions, params = [], []
+        if text:
+            pattern = f"%{text}%"
+            conditions.append(
+                "(patient_name LIKE ? OR mrn LIKE ? OR scan_indication_text LIKE ? "
+                "OR clinical_conclusion_text LIKE ? OR additional_observations_text LIKE ?)")
+            params.extend([pattern] * 5)
+        if reporter_name:
+            conditions.append("reporter_name = ?")
+            params.append(reporter_name)
+        return self._select_reports(conditions, params, start_date, end_date, limit)
+
+    def get_patient_reports(self, mrn, limit=None):
+        """Get prior reports for one patient, newest first"""
+        return self._select_reports(["mrn = ?"], [mrn], limit=limit)
+
+    def _select_reports(self, conditions, params, start_date=None, end_date=None, limit=None):
+        query = """
+        SELECT * FROM (
+            SELECT *,
+                decompress_text(scan_indication) AS scan_indication_text,
+                decompress_text(clinical_conclusion) AS clinical_conclusion_text,
+                decompress_text(additional_observations) AS additional_observations_text
+            FROM {source}
+        )
+        {where}
+        ORDER BY date_created DESC, id DESC
+        """
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        with self._connection() as conn:
+            conn.create_function('decompress_text', 1, _decompress_text, deterministic=True)
+            conn.row_factory = self._dict_row_factory
+            results = self._query_stores(
+                conn, query, start_date, end_date, conditions, params)
+        reports = [report for rows in results for report in rows]
+        reports.sort(key=lambda report: (report['date_created'] or '', report['id']), reverse=True)
+        for report in reports:
+            for column in ('scan_indication', 'clinical_conclusion', 'additional_observations'):
+                del report[f'{column}_text']
+        return reports[:limit] if limit is not None else reports
+
+    @staticmethod
+    def report_row_factory(cursor, row):
+        """sqlite3 row factory producing Report records"""
+        columns, compressed = _row_columns(cursor)
+        if compressed:
+            row = list(row)
+            for index in compressed:
+                row[index] = _decompress_text(row[index])
+        return Report.from_values(columns, row)
+
+    @staticmethod
+    def _dict_row_factory(cursor, row):
+        columns, compressed = _row_columns(cursor)
+        report = dict(zip(columns, row))
+        for index in compressed:
+            column = columns[index]
+            report[column] = _decompress_text(report[column])
+        return report
+
+    def archive_reports(self, before):
+        """Move reports created before the cutoff into per-year archive databases"""
+        cutoff = _timestamp(before)
+        with self._connection() as conn:
+            years = [row[0] for row in conn.execute(
+                "SELECT DISTINCT strftime('%Y', date_created) FROM reports "
+                "WHERE date_created < ? ORDER BY 1", (cutoff,))]
+
+        archived = 0
+        for year in years:
+            archived += self._archive_year(int(year), cutoff)
+        return archived
+
+    def _archive_year(self, year, cutoff):
+        archive_name = self._archive_file_name(year)
+        archive_path = self._resolve_archive(archive_name)
+        with sqlite3.connect(archive_path) as archive_conn:
+            self._create_schema(archive_conn)
+
+        conn = sqlite3.connect(self.db_file)
+        try:
+            conn.create_function('compress_text', 1, _compress_text, deterministic=True)
+            conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+            columns = [row[1] for row in conn.execute("PRAGMA main.table_info(reports)")]
+            selected = ', '.join(
+                f'compress_text({column})' if column in ARCHIVE_TEXT_COLUMNS else column
+                for column in columns)
+            condition = "date_created < ? AND strftime('%Y', date_created) = ?"
+            params = (cutoff, f'{year:04d}')
+
+            cursor = conn.execute(
+                f"INSERT INTO archive.reports ({', '.join(columns)}) "
+                f"SELECT {selected} FROM main.reports WHERE {condition}", params)
+            moved = cursor.rowcount
+            conn.execute(f"DELETE FROM main.reports WHERE {condition}", params)
+            conn.execute(
+                "INSERT OR REPLACE INTO archive_stores (year, db_file) VALUES (?, ?)",
+                (year, archive_name))
+            conn.commit()
+            conn.execute("DETACH DATABASE archive")
+            return moved
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+    def _archive_file_name(self, year):
+        stem, ext = os.path.splitext(os.path.basename(self.db_file))
+        return f"{stem}_archive_{year}{ext or '.db'}"
+
+    def _resolve_archive(self, archive_name):
+        return os.path.join(os.path.dirname(os.path.abspath(self.db_file)), archive_name)
+
+    def _archives_for_range(self, conn, start_date, end_date):
+        """Archive files whose year overlaps [start_date, end_date)"""
+        first, last = _archive_years(start_date, end_date)
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        rows = cursor.execute(
+            "SELECT db_file FROM archive_stores "
+            "WHERE (? IS NULL OR year >= ?) AND (? IS NULL OR year <= ?) ORDER BY year",
+            (first, first, last, last)).fetchall()
+        return [self._resolve_archive(row[0]) for row in rows]
+
+    def _archived_report(self, conn, report_id):
+        """A report from whichever archive store holds it, as a dictionary, or None"""
+        for archive_path in self._archives_for_range(conn, None, None):
+            if not os.path.exists(archive_path):
+                continue
+            conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+            try:
+                cursor = conn.cursor()
+                cursor.row_factory = self._dict_row_factory
+                report = cursor.execute(
+                    "SELECT * FROM archive.reports WHERE id = ?", (report_id,)).fetchone()
+            finally:
+                conn.execute("DETACH DATABASE archive")
+            if report is not None:
+                return report
+        return None
+
+    def _query_stores(self, conn, query, start_date=None, end_date=None,
+                      conditions=(), params=()):
+        """Run a query against the hot store and only the archives the range needs
+
+        The query uses {source} for the reports table and {where} for the date
+        filter plus any extra conditions; results are returned as one row list
+        per store for the caller to merge.
+        """
+        where, params = _where_clause(start_date, end_date, conditions, params)
+
+        results = [conn.execute(query.format(source='main.reports', where=where), params).fetchall()]
+        for archive_path in self._archives_for_range(conn, start_date, end_date):
+            if not os.path.exists(archive_path):
+                continue
+            conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+            try:
+                results.append(conn.execute(
+                    query.format(source='archive.reports', where=where), params).fetchall())
+            finally:
+                conn.execute("DETACH DATABASE archive")
+        return results
@@ -0,0 +1,392 @@
+"""Duplicate and near-duplicate patient detection
+
+Patients are the distinct (patient_name, mrn, dob) combinations in reports,
+archived ones included. Instead of comparing every pair, each patient gets
+a few blocking keys:
+
+    name   phonetic (Soundex) codes of the name tokens + birth year
+    dob    normalised date of birth
+    mrn    first MRN_PREFIX_LENGTH characters of the MRN
+    digits the MRN's characters sorted, so transposed digits share a block
+
+and only patients sharing a key are scored. Oversized blocks (e.g. a
+placeholder DOB used for many patients) are skipped. Pairs scoring above
+the threshold are stored in patient_merge_suggestions for review, once per
+pair whichever way round it is found, so a dismissed pair stays dismissed.
+Merging rewrites the duplicate's reports through DatabaseManager.update_report
+(and in the archive stores directly) so every change is in the revision
+history, and repoints other pending suggestions for the merged identity.
+
+Usage: python dedup.py [--db-file echo_reports.db] [--threshold 0.85]
+"""
+import argparse
+import json
+import os
+import re
+from collections import defaultdict
+from difflib import SequenceMatcher
+from itertools import combinations
+
+MRN_PREFIX_LENGTH = 6
+
+SOUNDEX_CODES = {
+    **dict.fromkeys('bfpv', '1'), **dict.fromkeys('cgjkqsxz', '2'),
+    **dict.fromkeys('dt', '3'), 'l': '4', **dict.fromkeys('mn', '5'), 'r': '6',
+}
+
+
+def soundex(word):
+    """Four-character Soundex code, e.g. soundex('Robert') == 'R163'"""
+    word = re.sub('[^a-z]', '', word.lower())
+    if not word:
+        return ''
+    code, previous = word[0].upper(), SOUNDEX_CODES.get(word[0])
+    for letter in word[1:]:
+        digit = SOUNDEX_CODES.get(letter)
+        if digit and digit != previous:
+            code += digit
+        if letter not in 'hw':
+            previous = digit
+    return (code + '000')[:4]
+
+
+def normalize_name(name):
+    """Lower-case name tokens in sorted order, so 'Smith, John' == 'john smith'"""
+    return ' '.join(sorted(re.findall('[a-z]+', (name or '').lower())))
+
+
+def normalize_dob(dob):
+    """ISO date from the app's dd/MM/yyyy format (ISO input is passed through)"""
+    dob = (dob or '').strip()
+    match = re.fullmatch(r'(\d{1,2})[/.-](\d{1,2})[/.-](\d{4})', dob)
+    if match:
+        day, month, year = match.groups()
+        return f"{year}-{int(month):02d}-{int(day):02d}"
+    return dob
+
+
+def normalize_mrn(mrn):
+    return re.sub(r'[^0-9A-Za-z]', '', mrn or '').upper()
+
+
+def within_one_edit(a, b):
+    """True if a and b differ by at most one substitution, insertion,
+    deletion or adjacent transposition"""
+    if a == b:
+        return True
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diffs = [i for i, (x, y) in enumerate(zip(a, b)) if x != y]
+        if len(diffs) == 1:
+            return True
+        return (len(diffs) == 2 and diffs[1] == diffs[0] + 1
+                and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]])
+    if len(a) > len(b):
+        a, b = b, a
+    for i in range(len(b)):
+        if b[:i] + b[i + 1:] == a:
+            return True
+    return False
+
+
+class Patient:
+    __slots__ = ('name', 'mrn', 'dob', 'report_count',
+                 'name_key', 'name_letters', 'mrn_key', 'dob_key')
+
+    def __init__(self, name, mrn, dob, report_count):
+        self.name = name
+        self.mrn = mrn
+        self.dob = dob
+        self.report_count = report_count
+        self.name_key = normalize_name(name)
+        # As typed, without spaces, for names split or joined in the wrong place
+        self.name_letters = re.sub('[^a-z]', '', (name or '').lower())
+        self.mrn_key = normalize_mrn(mrn)
+        self.dob_key = normalize_dob(dob)
+
+    def blocking_keys(self):
+        if self.name_key:
+            codes = ' '.join(soundex(token) for token in self.name_key.split())
+            yield ('name', codes, self.dob_key[:4])
+        if self.dob_key:
+            yield ('dob', self.dob_key)
+        if len(self.mrn_key) >= MRN_PREFIX_LENGTH:
+            yield ('mrn', self.mrn_key[:MRN_PREFIX_LENGTH])
+        if self.mrn_key:
+            yield ('digits', ''.join(sorted(self.mrn_key)))
+
+
+def pair_key(a, b):
+    """Order-independent key for two (name, mrn, dob) identities"""
+    return '\n'.join(sorted(json.dumps(list(identity)) for identity in (a, b)))
+
+
+def _similarity(a, b):
+    matcher = SequenceMatcher(None, a, b)
+    return matcher.ratio() if matcher.real_quick_ratio() > 0.6 else 0.0
+
+
+def score_pair(a, b, threshold=0.0):
+    """Similarity in [0, 1] over the identifiers both patients have, with reasons
+
+    DOB and MRN are scored first; the (comparatively slow) name comparison
+    is skipped when even a perfect name match could not reach `threshold`.
+    """
+    weights, total, reasons = 0.0, 0.0, []
+
+    if a.dob_key and b.dob_key:
+        weights += 0.3
+        if a.dob_key == b.dob_key:
+            total += 0.3
+            reasons.append("same DOB")
+        elif (len(a.dob_key) == len(b.dob_key) == 10
+              and a.dob_key[:4] == b.dob_key[:4]
+              and a.dob_key[5:7] == b.dob_key[8:10] and a.dob_key[8:10] == b.dob_key[5:7]):
+            total += 0.25
+            reasons.append("DOB day/month swapped")
+        elif within_one_edit(a.dob_key, b.dob_key):
+            total += 0.2
+            reasons.append("DOB differs by one digit")
+
+    if a.mrn_key and b.mrn_key:
+        weights += 0.3
+        if a.mrn_key == b.mrn_key:
+            total += 0.3
+            reasons.append("same MRN")
+        elif within_one_edit(a.mrn_key, b.mrn_key):
+            total += 0.25
+            reasons.append("MRN differs by one edit/transposition")
+
+    if a.name_key and b.name_key:
+        weights += 0.4
+        if total + 0.4 < threshold * weights:
+            return 0.0, reasons
+        similarity = max(_similarity(a.name_key, b.name_key),
+                         _similarity(a.name_letters, b.name_letters))
+        total += 0.4 * similarity
+        if similarity == 1.0:
+            reasons.insert(0, "same name")
+        elif similarity >= 0.8:
+            reasons.insert(0, f"similar name ({similarity:.2f})")
+
+    # Need at least two identifiers to call two patients the same
+    if weights < 0.6:
+        return 0.0, reasons
+    return total / weights, reasons
+
+
+class DuplicateFinder:
+    def __init__(self, db, threshold=0.85, max_block=500):
+        self.db = db
+        self.threshold = threshold
+        self.max_block = max_block
+
+    def load_patients(self):
+        """Distinct identities across the hot store and every archive"""
+        with self.db._connection() as conn:
+            results = self.db._query_stores(conn, """
+            SELECT patient_name, mrn, dob, COUNT(*)
+            FROM {source}
+            {where}
+            GROUP BY patient_name, mrn, dob
+            """)
+        counts = defaultdict(int)
+        for rows in results:
+            for name, mrn, dob, count in rows:
+                counts[name, mrn, dob] += count
+        return [Patient(name, mrn, dob, count) for (name, mrn, dob), count in counts.items()]
+
+    def candidate_pairs(self, patients):
+        blocks = defaultdict(list)
+        for index, patient in enumerate(patients):
+            for key in patient.blocking_keys():
+                blocks[key].append(index)
+
+        pairs = set()
+        for members in blocks.values():
+            if 1 < len(members) <= self.max_block:
+                pairs.update(combinations(members, 2))
+        return pairs
+
+    def find(self):
+        """Scored merge suggestions: [(keep, merge, score, reasons)], best first"""
+        patients = self.load_patients()
+        suggestions = []
+        for i, j in self.candidate_pairs(patients):
+            a, b = patients[i], patients[j]
+            score, reasons = score_pair(a, b, self.threshold)
+            if score >= self.threshold:
+                # Keep the identity used on more reports
+                keep, merge = (a, b) if a.report_count >= b.report_count else (b, a)
+                suggestions.append((keep, merge, score, reasons))
+        suggestions.sort(key=lambda suggestion: suggestion[2], reverse=True)
+        return suggestions
+
+    def refresh_suggestions(self):
+        """Find duplicates and store new ones as pending; returns the number
+        stored. Pairs already stored either way round, including dismissed
+        ones, are skipped."""
+        suggestions = self.find()
+        with self.db._connection() as conn:
+            self._backfill_pair_keys(conn)
+            cursor = conn.executemany("""
+            INSERT OR IGNORE INTO patient_merge_suggestions
+                (keep_name, keep_mrn, keep_dob, merge_name, merge_mrn, merge_dob,
+                 score, reasons, pair_key)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [
+                (keep.name, keep.mrn, keep.dob, merge.name, merge.mrn, merge.dob,
+                 round(score, 3), '; '.join(reasons),
+                 pair_key((keep.name, keep.mrn, keep.dob), (merge.name, merge.mrn, merge.dob)))
+                for keep, merge, score, reasons in suggestions
+            ])
+            conn.commit()
+            return cursor.rowcount
+
+    @staticmethod
+    def _backfill_pair_keys(conn):
+        """Key suggestions stored before pair_key existed. Of a pair stored
+        both ways round, the reviewed (else the older) suggestion is kept."""
+        rows = conn.execute("""
+        SELECT id, keep_name, keep_mrn, keep_dob, merge_name, merge_mrn, merge_dob
+        FROM patient_merge_suggestions WHERE pair_key IS NULL
+        ORDER BY status = 'pending', id
+        """).fetchall()
+        for suggestion_id, *identities in rows:
+            key = pair_key(identities[:3], identities[3:])
+            if conn.execute("SELECT 1 FROM patient_merge_suggestions WHERE pair_key = ?",
+                            (key,)).fetchone():
+                conn.execute("DELETE FROM patient_merge_suggestions WHERE id = ?", (suggestion_id,))
+            else:
+                conn.execute("UPDATE patient_merge_suggestions SET pair_key = ? WHERE id = ?",
+                             (key, suggestion_id))
+
+    def pending_suggestions(self):
+        with self.db._connection() as conn:
+            self._backfill_pair_keys(conn)
+            conn.commit()
+            conn.row_factory = self.db._dict_row_factory
+            return conn.execute("""
+            SELECT * FROM patient_merge_suggestions
+            WHERE status = 'pending'
+            ORDER BY score DESC, id
+            """).fetchall()
+
+    def merge(self, suggestion_id, revised_by=None):
+        """Rewrite the duplicate's reports to the kept identity; returns reports changed"""
+        with self.db._connection() as conn:
+            suggestion = conn.execute("""
+            SELECT keep_name, keep_mrn, keep_dob, merge_name, merge_mrn, merge_dob
+            FROM patient_merge_suggestions WHERE id = ? AND status = 'pending'
+            """, (suggestion_id,)).fetchone()
+            if suggestion is None:
+                raise LookupError(f"No pending merge suggestion {suggestion_id}")
+            keep_name, keep_mrn, keep_dob, merge_name, merge_mrn, merge_dob = suggestion
+            reports = conn.execute(
+                "SELECT id, version FROM reports WHERE patient_name IS ? AND mrn IS ? AND dob IS ?",
+                (merge_name, merge_mrn, merge_dob)).fetchall()
+
+        changes = {'patient_name': keep_name, 'mrn': keep_mrn, 'dob': keep_dob}
+        for report_id, version in reports:
+            self.db.update_report(report_id, changes, version, revised_by)
+        archived = self._merge_archived((merge_name, merge_mrn, merge_dob), changes, revised_by)
+        self._set_status(suggestion_id, 'merged')
+        self._repoint_pending((merge_name, merge_mrn, merge_dob), (keep_name, keep_mrn, keep_dob))
+        return len(reports) + archived
+
+    def _repoint_pending(self, merged, kept):
+        """Point pending suggestions for the merged identity at the kept one,
+        which now has its reports. A suggestion that would pair the kept
+        identity with itself, or duplicate a stored pair, is closed."""
+        with self.db._connection() as conn:
+            self._backfill_pair_keys(conn)
+            rows = conn.execute("""
+            SELECT id, keep_name, keep_mrn, keep_dob, merge_name, merge_mrn, merge_dob
+            FROM patient_merge_suggestions
+            WHERE status = 'pending'
+              AND ((keep_name IS ? AND keep_mrn IS ? AND keep_dob IS ?)
+                   OR (merge_name IS ? AND merge_mrn IS ? AND merge_dob IS ?))
+            """, merged + merged).fetchall()
+            for suggestion_id, *identities in rows:
+                keep, merge = tuple(identities[:3]), tuple(identities[3:])
+                other = merge if keep == merged else keep
+                key = pair_key(kept, other)
+                if other == kept or conn.execute(
+                        "SELECT 1 FROM patient_merge_suggestions WHERE pair_key = ?",
+                        (key,)).fetchone():
+                    conn.execute("UPDATE patient_merge_suggestions SET status = 'superseded' "
+                                 "WHERE id = ?", (suggestion_id,))
+                else:
+                    conn.execute("""
+                    UPDATE patient_merge_suggestions
+                    SET keep_name = ?, keep_mrn = ?, keep_dob = ?,
+                        merge_name = ?, merge_mrn = ?, merge_dob = ?, pair_key = ?
+                    WHERE id = ?
+                    """, kept + other + (key, suggestion_id))
+            conn.commit()
+
+    def _merge_archived(self, identity, changes, revised_by):
+        """Rewrite the identity in archive stores too, so per-patient history
+        is not split. Archives are otherwise read-only; the revisions are
+        recorded in the hot store like those of any archived report."""
+        merged = 0
+        with self.db._connection() as conn:
+            for archive_path in self.db._archives_for_range(conn, None, None):
+                if not os.path.exists(archive_path):
+                    continue
+                conn.execute("ATTACH DATABASE ? AS archive", (archive_path,))
+                try:
+                    reports = conn.execute(
+                        "SELECT id, version FROM archive.reports "
+                        "WHERE patient_name IS ? AND mrn IS ? AND dob IS ?", identity).fetchall()
+                    previous = {column: value for column, value in zip(changes, identity)
+                                if value != changes[column]}
+                    if reports and previous:
+                        conn.executemany(
+                            "UPDATE archive.reports SET patient_name = ?, mrn = ?, dob = ?, "
+                            "version = ? WHERE id = ?",
+                            [(changes['patient_name'], changes['mrn'], changes['dob'],
+                              version + 1, report_id) for report_id, version in reports])
+                        conn.executemany(
+                            "INSERT INTO main.report_revisions "
+                            "(report_id, version, revised_by, previous_values) VALUES (?, ?, ?, ?)",
+                            [(report_id, version + 1, revised_by, json.dumps(previous))
+                             for report_id, version in reports])
+                        merged += len(reports)
+                    conn.commit()
+                finally:
+                    # DETACH is not allowed inside a transaction
+                    conn.rollback()
+                    conn.execute("DETACH DATABASE archive")
+        return merged
+
+    def dismiss(self, suggestion_id):
+        self._set_status(suggestion_id, 'dismissed')
+
+    def _set_status(self, suggestion_id, status):
+        with self.db._connection() as conn:
+            conn.execute("UPDATE patient_merge_suggestions SET status = ? WHERE id = ?",
+                         (status, suggestion_id))
+            conn.commit()
+
+
+def main():
+    from db_manager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Find duplicate patients in echo reports")
+    parser.add_argument('--db-file', default='echo_reports.db')
+    parser.add_argument('--threshold', type=float, default=0.85)
+    parser.add_argument('--max-block', type=int, default=500)
+    args = parser.parse_args()
+
+    finder = DuplicateFinder(DatabaseManager(args.db_file), args.threshold, args.max_block)
+    print(f"New merge suggestions: {finder.refresh_suggestions()}")
+    for suggestion in finder.pending_suggestions():
+        print(f"{suggestion['id']}: {suggestion['merge_name']} ({suggestion['merge_mrn']}) -> "
+              f"{suggestion['keep_name']} ({suggestion['keep_mrn']}) "
+              f"score {suggestion['score']:.2f}: {suggestion['reasons']}")
+
+
+if __name__ == '__main__':
+    main()
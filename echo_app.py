@@ -1,16 +1,71 @@
+import os
 import sys
+import threading
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                             QTabWidget, QPushButton, QLabel, QLineEdit, 
                             QRadioButton, QButtonGroup, QScrollArea, QGridLayout,
-                            QDateEdit, QGroupBox, QHBoxLayout, QCheckBox, QTextEdit)
-from PyQt6.QtCore import Qt, QDate
-from db_manager import DatabaseManager
+                            QDateEdit, QGroupBox, QHBoxLayout, QCheckBox, QTextEdit,
+                            QListWidget, QListWidgetItem)
+from PyQt6.QtCore import Qt, QDate, QTimer, pyqtSignal
 
 class EchoReportApp(QMainWindow):
-    def __init__(self):
+    # Emitted from the duplicate-search thread with the count or the exception
+    duplicates_found = pyqtSignal(object)
+
+    def __init__(self, db_file='echo_reports.db', outbox_path=None):
         super().__init__()
+        self.db_file = db_file
+        self._db = None
+        self._duplicate_search = None
+        self.duplicates_found.connect(self.on_duplicates_found)
         self.init_ui()
-        self.db = DatabaseManager()
+        self.start_outbox(outbox_path)
+
+    @property
+    def db(self):
+        """Open the database on first use so it stays off the start-up path"""
+        if self._db is None:
+            from db_manager import DatabaseManager
+            self._db = DatabaseManager(self.db_file)
+        return self._db
+
+    def start_outbox(self, outbox_path=None):
+        from outbox import Outbox, OutboxFlusher, journal_for
+
+        self.outbox = Outbox(outbox_path or journal_for(self.db_file))
+        self.flusher = OutboxFlusher(
+            self.outbox, lambda: self.db, on_saved=self.on_reports_saved).start()
+        self.outbox_timer = QTimer(self)
+        self.outbox_timer.timeout.connect(self.update_outbox_status)
+        self.outbox_timer.start(1000)
+        self.update_outbox_status()
+
+    def update_outbox_status(self):
+        """Show reports still waiting for the database and ones it rejected"""
+        try:
+            pending = self.outbox.pending_count()
+            failed = self.outbox.failed_count()
+        except Exception as e:
+            self.outbox_status.setText(f"Outbox unreadable: {e}")
+            self.outbox_status.show()
+            return
+        parts = []
+        if pending:
+            parts.append(f"{pending} report(s) waiting to be saved")
+            if self.flusher.last_error is not None:
+                parts.append(f"database unavailable: {self.flusher.last_error}")
+        if failed:
+            parts.append(f"{failed} report(s) could not be saved, see {self.outbox.failed_path}")
+        self.outbox_status.setText('; '.join(parts))
+        self.outbox_status.setVisible(bool(parts))
+
+    def closeEvent(self, event):
+        self.outbox_timer.stop()
+        self.flusher.stop()
+        self.outbox.close()
+        if self._db is not None:
+            self._db.close()
+        super().closeEvent(event)
 
     def init_ui(self):
         # Set window properties
@@ -33,12 +88,20 @@ class EchoReportApp(QMainWindow):
         self.create_valve_tab()
         self.create_other_findings_tab()
         self.create_conclusions_tab()
+        self.create_duplicates_tab()
 
         # Add save button at the bottom
         save_button = QPushButton("Save Report")
         save_button.clicked.connect(self.save_report)
         main_layout.addWidget(save_button)
 
+        # Outbox delivery problems; hidden while everything is saved
+        self.outbox_status = QLabel()
+        self.outbox_status.setWordWrap(True)
+        self.outbox_status.setStyleSheet("color: red;")
+        self.outbox_status.hide()
+        main_layout.addWidget(self.outbox_status)
+
     def create_scan_quality_tab(self):
         scan_quality_tab = QScrollArea()
         scan_quality_tab.setWidgetResizable(True)
@@ -738,6 +801,108 @@ class EchoReportApp(QMainWindow):
         layout.addStretch()
     
     
+    def create_duplicates_tab(self):
+        duplicates_tab = QWidget()
+        duplicates_layout = QVBoxLayout(duplicates_tab)
+
+        self.setup_duplicates_section(duplicates_layout)
+
+        self.tabs.addTab(duplicates_tab, "Duplicate Patients")
+
+    def setup_duplicates_section(self, layout):
+        note_label = QLabel("Possible duplicate patients. Merging rewrites the duplicate's "
+                            "reports to the kept identity; every change is kept in the report history.")
+        note_label.setWordWrap(True)
+        note_label.setStyleSheet("font-style: italic;")
+        layout.addWidget(note_label)
+
+        self.duplicates_list = QListWidget()
+        layout.addWidget(self.duplicates_list)
+
+        buttons_layout = QHBoxLayout()
+        self.find_duplicates_button = QPushButton("Find Duplicates")
+        self.find_duplicates_button.clicked.connect(self.find_duplicates)
+        merge_button = QPushButton("Merge Selected")
+        merge_button.clicked.connect(self.merge_selected_duplicate)
+        dismiss_button = QPushButton("Dismiss Selected")
+        dismiss_button.clicked.connect(self.dismiss_selected_duplicate)
+        buttons_layout.addWidget(self.find_duplicates_button)
+        buttons_layout.addWidget(merge_button)
+        buttons_layout.addWidget(dismiss_button)
+        buttons_layout.addStretch()
+        layout.addLayout(buttons_layout)
+
+    @property
+    def duplicate_finder(self):
+        from dedup import DuplicateFinder
+        return DuplicateFinder(self.db)
+
+    def find_duplicates(self):
+        """Search in a worker thread; on a large logbook it takes long enough
+        to freeze the window"""
+        if self._duplicate_search is not None and self._duplicate_search.is_alive():
+            return
+        self.find_duplicates_button.setEnabled(False)
+        self.find_duplicates_button.setText("Searching...")
+        self._duplicate_search = threading.Thread(
+            target=self._search_duplicates, name='duplicate-search', daemon=True)
+        self._duplicate_search.start()
+
+    def _search_duplicates(self):
+        try:
+            result = self.duplicate_finder.refresh_suggestions()
+        except Exception as e:
+            result = e
+        # Queued to the GUI thread
+        self.duplicates_found.emit(result)
+
+    def on_duplicates_found(self, result):
+        self.find_duplicates_button.setEnabled(True)
+        self.find_duplicates_button.setText("Find Duplicates")
+        if isinstance(result, Exception):
+            print(f"Error finding duplicates: {str(result)}")
+        else:
+            print(f"Found {result} new possible duplicate patients")
+        self.refresh_duplicates_list()
+
+    def refresh_duplicates_list(self):
+        self.duplicates_list.clear()
+        try:
+            suggestions = self.duplicate_finder.pending_suggestions()
+        except Exception as e:
+            print(f"Error loading duplicates: {str(e)}")
+            return
+
+        for suggestion in suggestions:
+            text = (f"{suggestion['merge_name']} / {suggestion['merge_mrn']} / {suggestion['merge_dob']}"
+                    f"  \u2192  {suggestion['keep_name']} / {suggestion['keep_mrn']} / {suggestion['keep_dob']}"
+                    f"   (score {suggestion['score']:.2f}: {suggestion['reasons']})")
+            item = QListWidgetItem(text)
+            item.setData(Qt.ItemDataRole.UserRole, suggestion['id'])
+            self.duplicates_list.addItem(item)
+
+    def merge_selected_duplicate(self):
+        item = self.duplicates_list.currentItem()
+        if item is None:
+            return
+        try:
+            changed = self.duplicate_finder.merge(
+                item.data(Qt.ItemDataRole.UserRole), revised_by=self.name_input.text() or None)
+            print(f"Merged duplicate patient: {changed} reports updated")
+        except Exception as e:
+            print(f"Error merging duplicate: {str(e)}")
+        self.refresh_duplicates_list()
+
+    def dismiss_selected_duplicate(self):
+        item = self.duplicates_list.currentItem()
+        if item is None:
+            return
+        try:
+            self.duplicate_finder.dismiss(item.data(Qt.ItemDataRole.UserRole))
+        except Exception as e:
+            print(f"Error dismissing duplicate: {str(e)}")
+        self.refresh_duplicates_list()
+
     def save_report(self):
         # Format data for database (flatten the nested dictionaries)
         report_data = {
@@ -803,23 +968,56 @@ class EchoReportApp(QMainWindow):
             'training_status': self.training_status_input.text()
         }
         
+        # Queue in the local outbox first so the report survives the
+        # database being unreachable; the flusher delivers it
         try:
-            # Save to database
-            report_id = self.db.save_report(report_data)
-            print(f"\nReport saved to database with ID: {report_id}")
-            
-            # Print data for verification
-            print("\nSaved Data:")
-            for key, value in report_data.items():
-                print(f"{key}: {value}")
-                
+            idempotency_key = self.outbox.append(report_data)
         except Exception as e:
             print(f"Error saving report: {str(e)}")
+            return
+
+        print(f"\nReport queued for saving (key {idempotency_key})")
+
+        # Print data for verification
+        print("\nSaved Data:")
+        for key, value in report_data.items():
+            print(f"{key}: {value}")
+
+        self.flusher.notify()
+
+    def on_reports_saved(self, saved):
+        """Called from the outbox flusher once queued reports reach the database"""
+        for report_id in saved.values():
+            print(f"\nReport saved to database with ID: {report_id}")
+            self.audit_report(report_id)
+
+    def audit_report(self, report_id):
+        """Run the incremental data-quality audit and show findings for this report"""
+        from audit import AuditEngine
+
+        try:
+            engine = AuditEngine(self.db)
+            engine.run()
+            findings = engine.get_findings(report_id)
+        except Exception as e:
+            print(f"Error auditing report: {str(e)}")
+            return
+
+        if findings:
+            print("\nData-quality findings:")
+            for finding in findings:
+                print(f"[{finding['severity']}] {finding['rule_name']}")
 
 def main():
     app = QApplication(sys.argv)
     window = EchoReportApp()
     window.show()
+
+    # ECHO_STALL_THRESHOLD_MS=<ms> logs a main-thread stack whenever the UI freezes
+    stall_threshold = os.environ.get('ECHO_STALL_THRESHOLD_MS')
+    if stall_threshold:
+        from ui_watchdog import StallWatchdog
+        window.watchdog = StallWatchdog(float(stall_threshold), on_stall=StallWatchdog.print_stall).start()
     sys.exit(app.exec())
 
 if __name__ == '__main__':
@@ -0,0 +1,307 @@
+"""Pseudonymised research extract of the reports table
+
+Reports are streamed in batches and pseudonymised in worker processes:
+
+- patient_name, mrn and dob are replaced by a keyed HMAC-SHA256 patient id
+  (stable across extracts made with the same key);
+- date_created and dob are shifted by a per-patient offset derived from the
+  same key, so intervals between a patient's scans and their age at scan
+  are preserved;
+- reporter_name and training_approval become keyed staff ids;
+- free-text fields have the patient's own identifiers (including earlier
+  values replaced by an edit or a patient merge, from report_revisions) and
+  anything that looks like a date or an MRN/NHS number replaced with
+  [REDACTED].
+
+At most `queue_size` batches are in flight, so memory stays bounded however
+large the logbook is. Output is a new SQLite database or, with pyarrow
+installed, a Parquet file.
+
+The key is read from --key-file or the ECHO_PSEUDONYM_KEY environment
+variable and must be kept secret: anyone holding it can re-identify patients
+by hashing candidate MRNs.
+
+Usage: python extract.py OUTPUT.db|OUTPUT.parquet [--db-file echo_reports.db]
+                         [--key-file KEY] [--workers N] [--start DATE] [--end DATE]
+"""
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import re
+import sqlite3
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import suppress
+from datetime import datetime, timedelta
+
+from dedup import normalize_dob, normalize_mrn
+
+MAX_DATE_SHIFT_DAYS = 180
+REDACTED = '[REDACTED]'
+
+IDENTITY_COLUMNS = ('patient_name', 'mrn', 'dob')
+
+FREE_TEXT_COLUMNS = ('scan_indication', 'quality_comments',
+                     'additional_observations', 'clinical_conclusion')
+
+# Clinical columns copied unchanged
+CLINICAL_COLUMNS = (
+    'gender', 'scan_indication', 'scan_quality', 'quality_comments',
+    'view_psax', 'view_plax', 'view_a4c', 'view_a5c', 'view_subx',
+    'lv_size', 'lvidd', 'lv_function', 'wall_motion_abnormality',
+    'rv_size', 'rv_function', 'tapse', 'septum_shape',
+    'av_status', 'mv_status', 'tv_status',
+    'aortic_root', 'ivc', 'pericardial_fluid', 'pleural_effusion',
+    'additional_observations', 'clinical_conclusion',
+    'requires_level2', 'physician_informed', 'training_status'
+)
+
+OUTPUT_COLUMNS = ('patient_id', 'scan_date', 'dob') + CLINICAL_COLUMNS + ('reporter_id', 'approver_id')
+
+# Typed Parquet columns; everything else is written as a string
+BOOLEAN_COLUMNS = ('view_psax', 'view_plax', 'view_a4c', 'view_a5c', 'view_subx',
+                   'wall_motion_abnormality', 'requires_level2', 'physician_informed')
+NUMERIC_COLUMNS = ('lvidd', 'tapse')
+
+DATE_PATTERN = re.compile(r'\b\d{1,4}[/.-]\d{1,2}[/.-]\d{1,4}\b')
+# MRN/NHS-style numbers: six or more digits, optionally grouped with spaces
+NUMBER_PATTERN = re.compile(r'\b\d(?:[ -]?\d){5,}\b')
+
+
+def _digest(key, label, value):
+    return hmac.new(key, f'{label}:{value}'.encode('utf-8'), hashlib.sha256).digest()
+
+
+def pseudonym(key, label, value):
+    """Stable keyed pseudonym, e.g. pseudonym(key, 'patient', mrn)"""
+    if not value:
+        return None
+    return _digest(key, label, value).hex()[:20]
+
+
+def date_shift(key, patient_key):
+    """Per-patient offset of 1 to MAX_DATE_SHIFT_DAYS days either way"""
+    digest = _digest(key, 'shift', patient_key)
+    days = int.from_bytes(digest[:4], 'big') % MAX_DATE_SHIFT_DAYS + 1
+    return timedelta(days=days if digest[4] & 1 else -days)
+
+
+def _shift(value, shift, formats):
+    for fmt in formats:
+        try:
+            return (datetime.strptime(value, fmt) + shift).strftime(fmt)
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def scrub_text(text, identifiers):
+    """Remove the patient's identifiers and date/MRN-like strings from free text"""
+    if not text:
+        return text
+    for identifier in identifiers:
+        text = re.sub(rf'\b{re.escape(identifier)}\b', REDACTED, text, flags=re.IGNORECASE)
+    text = DATE_PATTERN.sub(REDACTED, text)
+    return NUMBER_PATTERN.sub(REDACTED, text)
+
+
+def _identifiers(name, mrn, dob):
+    """Strings identifying a patient in free text, as typed and normalised"""
+    identifiers = [token for token in re.findall(r'[A-Za-z]+', name or '') if len(token) > 1]
+    return identifiers + [value for value in (mrn, normalize_mrn(mrn), dob, normalize_dob(dob))
+                          if value]
+
+
+def pseudonymize_report(report, key, previous_identities=()):
+    """One output row (in OUTPUT_COLUMNS order) for a report dictionary
+
+    `previous_identities` are earlier {column: value} identity values of the
+    report, which are scrubbed from free text too.
+    """
+    mrn = normalize_mrn(report.get('mrn'))
+    dob = normalize_dob(report.get('dob'))
+    name = (report.get('patient_name') or '').strip()
+    # Fall back to name + DOB for reports saved without an MRN
+    patient_key = mrn or f"{name.lower()}|{dob}"
+    shift = date_shift(key, patient_key)
+
+    identifiers = _identifiers(name, report.get('mrn'), report.get('dob'))
+    for identity in previous_identities:
+        identifiers += _identifiers(identity.get('patient_name'), identity.get('mrn'),
+                                    identity.get('dob'))
+
+    row = {
+        'patient_id': pseudonym(key, 'patient', patient_key.strip('|')),
+        'scan_date': _shift(report.get('date_created'), shift, ('%Y-%m-%d %H:%M:%S', '%Y-%m-%d')),
+        'dob': _shift(dob, shift, ('%Y-%m-%d',)),
+        'reporter_id': pseudonym(key, 'staff', (report.get('reporter_name') or '').strip().lower()),
+        'approver_id': pseudonym(key, 'staff', (report.get('training_approval') or '').strip().lower()),
+    }
+    for column in CLINICAL_COLUMNS:
+        value = report.get(column)
+        if column in FREE_TEXT_COLUMNS:
+            value = scrub_text(value, identifiers)
+        row[column] = value
+    return tuple(row[column] for column in OUTPUT_COLUMNS)
+
+
+def _float_or_none(value):
+    # The app stores measurements as typed, so blanks and stray text become null
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def pseudonymize_batch(reports, key):
+    """Rows for a batch of (report, previous_identities) pairs"""
+    return [pseudonymize_report(report, key, previous) for report, previous in reports]
+
+
+def previous_identities(db, reports):
+    """Pair each report with the identity values its revisions replaced"""
+    placeholders = ', '.join('?' * len(reports))
+    with db._connection() as conn:
+        rows = conn.execute(
+            "SELECT report_id, previous_values FROM report_revisions "
+            f"WHERE report_id IN ({placeholders})", [report['id'] for report in reports])
+        previous = {}
+        for report_id, previous_values in rows:
+            values = json.loads(previous_values)
+            identity = {column: values[column] for column in IDENTITY_COLUMNS if column in values}
+            if identity:
+                previous.setdefault(report_id, []).append(identity)
+    return [(report, previous.get(report['id'], ())) for report in reports]
+
+
+def bounded_map(executor, func, batches, queue_size, *args):
+    """Like executor.map, but never more than queue_size batches in flight"""
+    in_flight = deque()
+    for batch in batches:
+        in_flight.append(executor.submit(func, batch, *args))
+        if len(in_flight) >= queue_size:
+            yield in_flight.popleft().result()
+    while in_flight:
+        yield in_flight.popleft().result()
+
+
+class SQLiteWriter:
+    def __init__(self, path):
+        if os.path.exists(path):
+            raise FileExistsError(f"{path} already exists")
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(f"CREATE TABLE research_reports ({', '.join(OUTPUT_COLUMNS)})")
+        self.sql = (f"INSERT INTO research_reports ({', '.join(OUTPUT_COLUMNS)}) "
+                    f"VALUES ({', '.join('?' * len(OUTPUT_COLUMNS))})")
+
+    def write(self, rows):
+        self.conn.executemany(self.sql, rows)
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+
+class ParquetWriter:
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit("Parquet output needs pyarrow: pip install pyarrow")
+        if os.path.exists(path):
+            raise FileExistsError(f"{path} already exists")
+        self.pa = pa
+        self.schema = pa.schema([
+            (column, pa.bool_() if column in BOOLEAN_COLUMNS
+             else pa.float64() if column in NUMERIC_COLUMNS
+             else pa.string())
+            for column in OUTPUT_COLUMNS
+        ])
+        self.writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, rows):
+        columns = list(zip(*rows)) if rows else [[] for _ in OUTPUT_COLUMNS]
+        arrays = []
+        for field, values in zip(self.schema, columns):
+            if self.pa.types.is_boolean(field.type):
+                values = [None if value is None else bool(value) for value in values]
+            elif self.pa.types.is_floating(field.type):
+                values = [_float_or_none(value) for value in values]
+            else:
+                values = [None if value is None else str(value) for value in values]
+            arrays.append(self.pa.array(values, type=field.type))
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+
+def run_extract(db, output_path, key, workers=None, batch_size=2000, queue_size=None,
+                start_date=None, end_date=None):
+    """Write the extract; returns the number of reports written
+
+    The output is built under a temporary name and only renamed to
+    `output_path` once complete, so a failed run never leaves a partial
+    extract that looks finished.
+    """
+    if os.path.exists(output_path):
+        raise FileExistsError(f"{output_path} already exists")
+    partial_path = f"{output_path}.{os.getpid()}.partial"
+    writer_class = ParquetWriter if output_path.endswith('.parquet') else SQLiteWriter
+    writer = writer_class(partial_path)
+    workers = workers or os.cpu_count() or 1
+    written = 0
+    try:
+        batches = (previous_identities(db, batch)
+                   for batch in db.iter_report_batches(batch_size, start_date, end_date))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            for rows in bounded_map(executor, pseudonymize_batch, batches,
+                                    queue_size or 2 * workers, key):
+                writer.write(rows)
+                written += len(rows)
+        writer.close()
+    except BaseException:
+        with suppress(Exception):
+            writer.close()
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+    os.replace(partial_path, output_path)
+    return written
+
+
+def load_key(key_file=None):
+    if key_file:
+        with open(key_file, 'rb') as key_source:
+            key = key_source.read().strip()
+    else:
+        key = os.environ.get('ECHO_PSEUDONYM_KEY', '').encode('utf-8')
+    if len(key) < 16:
+        raise SystemExit("A pseudonymisation key of at least 16 bytes is required "
+                         "(--key-file or ECHO_PSEUDONYM_KEY)")
+    return key
+
+
+def main():
+    from db_manager import DatabaseManager
+
+    parser = argparse.ArgumentParser(description="Write a pseudonymised research extract")
+    parser.add_argument('output', help="new .db (SQLite) or .parquet file")
+    parser.add_argument('--db-file', default='echo_reports.db')
+    parser.add_argument('--key-file')
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--batch-size', type=int, default=2000)
+    parser.add_argument('--start', help="start date (inclusive)")
+    parser.add_argument('--end', help="end date (exclusive)")
+    args = parser.parse_args()
+
+    written = run_extract(DatabaseManager(args.db_file), args.output, load_key(args.key_file),
+                          args.workers, args.batch_size, start_date=args.start, end_date=args.end)
+    print(f"Wrote {written} pseudonymised reports to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+"""Read-only queries across many echo report databases
+
+FederatedDatabaseManager attaches the site databases (and any archives they
+list for the requested date range) to one in-memory connection, in batches
+that fit SQLite's attach limit, and runs the normal DatabaseManager queries
+over a single UNION ALL of their reports tables. Per-batch results are merged
+by the same code that merges hot and archive stores, so summaries, trends and
+search results are identical to querying one combined database. Every row
+carries a source_site column (the site database's path) because report ids
+repeat across sites. With `processes` set, batches are fanned out to a
+process pool.
+
+The view is read-only: writes, and lookups by report id (ambiguous across
+sites), raise ReadOnlyDatabaseError.
+
+Usage: python federation.py site_a.db site_b.db ... [--processes 4]
+"""
+import argparse
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from db_manager import DatabaseManager, _archive_years, _decompress_text, _where_clause
+from report_model import REPORT_COLUMNS
+
+DEFAULT_ATTACH_LIMIT = 10
+
+
+class ReadOnlyDatabaseError(Exception):
+    """The operation writes to, or looks up a single report in, a federated view"""
+
+
+def _readonly_uri(db_file):
+    return Path(db_file).resolve().as_uri() + '?mode=ro'
+
+
+def _open_connection():
+    conn = sqlite3.connect('file::memory:', uri=True)
+    conn.create_function('decompress_text', 1, _decompress_text, deterministic=True)
+    return conn
+
+
+def _attach_limit(conn):
+    try:
+        return conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED)
+    except AttributeError:
+        # Connection.getlimit() was added in Python 3.11
+        return DEFAULT_ATTACH_LIMIT
+
+
+def _site_columns(conn, alias):
+    """Select list for one site, with NULL for columns its schema predates"""
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    present = {row[1] for row in cursor.execute(f"PRAGMA {alias}.table_info(reports)")}
+    return ', '.join(column if column in present else f'NULL AS {column}'
+                     for column in REPORT_COLUMNS)
+
+
+def _sql_literal(value):
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _query_batch(conn, sources, query, where, params):
+    """Run `query` over the UNION ALL of the reports tables of `sources`,
+    a list of (site, db_file) pairs"""
+    aliases = []
+    try:
+        for index, (site, db_file) in enumerate(sources):
+            alias = f'site_{index}'
+            conn.execute(f"ATTACH DATABASE ? AS {alias}", (_readonly_uri(db_file),))
+            aliases.append((site, alias))
+        source = '(' + ' UNION ALL '.join(
+            f'SELECT {_sql_literal(site)} AS source_site, {_site_columns(conn, alias)} '
+            f'FROM {alias}.reports' for site, alias in aliases) + ')'
+        return conn.execute(query.format(source=source, where=where), params).fetchall()
+    finally:
+        for _, alias in aliases:
+            conn.execute(f"DETACH DATABASE {alias}")
+
+
+def _run_batch(sources, query, where, params, row_factory):
+    """Process-pool entry point: query one batch on a fresh connection"""
+    conn = _open_connection()
+    conn.row_factory = row_factory
+    try:
+        return _query_batch(conn, sources, query, where, params)
+    finally:
+        conn.close()
+
+
+class FederatedDatabaseManager(DatabaseManager):
+    def __init__(self, db_files, processes=None, batch_size=None):
+        if not db_files:
+            raise ValueError("At least one database file is required")
+        missing = [db_file for db_file in db_files if not os.path.exists(db_file)]
+        if missing:
+            raise FileNotFoundError(f"Database files not found: {', '.join(missing)}")
+        self.db_files = list(db_files)
+        self.db_file = ':memory:'
+        self.processes = processes
+        with self._connection() as conn:
+            limit = _attach_limit(conn)
+        self.batch_size = min(batch_size or limit, limit)
+
+    @contextmanager
+    def _connection(self):
+        conn = _open_connection()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def close(self):
+        # Connections are opened per query
+        pass
+
+    def _read_only(self, operation):
+        raise ReadOnlyDatabaseError(
+            f"{operation} is not available on a read-only federated view; "
+            "open the site database with DatabaseManager instead")
+
+    def save_report(self, report_data):
+        self._read_only('save_report')
+
+    def save_reports(self, entries):
+        self._read_only('save_reports')
+
+    def update_report(self, report_id, changes, expected_version, revised_by=None):
+        self._read_only('update_report')
+
+    def archive_reports(self, before):
+        self._read_only('archive_reports')
+
+    def get_report(self, report_id, version=None):
+        self._read_only('get_report')
+
+    def get_report_history(self, report_id):
+        self._read_only('get_report_history')
+
+    def iter_report_batches(self, batch_size=1000, start_date=None, end_date=None):
+        self._read_only('iter_report_batches')
+
+    def _source_files(self, start_date, end_date):
+        """(site, db_file) for the site databases plus the archives each one
+        needs for the date range"""
+        first, last = _archive_years(start_date, end_date)
+        files = []
+        for db_file in self.db_files:
+            files.append((db_file, db_file))
+            conn = sqlite3.connect(_readonly_uri(db_file), uri=True)
+            try:
+                rows = conn.execute(
+                    "SELECT db_file FROM archive_stores "
+                    "WHERE (? IS NULL OR year >= ?) AND (? IS NULL OR year <= ?) ORDER BY year",
+                    (first, first, last, last)).fetchall()
+            except sqlite3.OperationalError:
+                # Site predates archiving
+                rows = []
+            finally:
+                conn.close()
+            site_dir = os.path.dirname(os.path.abspath(db_file))
+            files.extend((db_file, path) for path in (os.path.join(site_dir, row[0]) for row in rows)
+                         if os.path.exists(path))
+        return files
+
+    def _query_stores(self, conn, query, start_date=None, end_date=None,
+                      conditions=(), params=()):
+        where, params = _where_clause(start_date, end_date, conditions, params)
+        files = self._source_files(start_date, end_date)
+        batches = [files[i:i + self.batch_size] for i in range(0, len(files), self.batch_size)]
+
+        if self.processes and len(batches) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.processes, len(batches))) as executor:
+                futures = [executor.submit(_run_batch, batch, query, where, params, conn.row_factory)
+                           for batch in batches]
+                return [future.result() for future in futures]
+        return [_query_batch(conn, batch, query, where, params) for batch in batches]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarise many echo report databases at once")
+    parser.add_argument('db_files', nargs='+')
+    parser.add_argument('--processes', type=int, help="fan batches out to a process pool")
+    parser.add_argument('--start', help="start date (inclusive)")
+    parser.add_argument('--end', help="end date (exclusive)")
+    args = parser.parse_args()
+
+    db = FederatedDatabaseManager(args.db_files, processes=args.processes)
+    print(f"Scans completed: {db.get_scans_completed(args.start, args.end)}")
+    print("\nPathology summary:")
+    for finding, count in db.get_pathology_summary(args.start, args.end).items():
+        print(f"  {finding}: {count}")
+    print("\nQuality trends:")
+    for month, scan_quality, count in db.get_quality_trends(args.start, args.end):
+        print(f"  {month} {scan_quality}: {count}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+"""Durable local outbox for report saves
+
+Saves are appended to a JSON-lines journal on local disk and acknowledged
+straight away; a background thread fsyncs the journal in batches. The
+OutboxFlusher drains pending entries into the reports table in batched
+transactions whenever the database is reachable. Every entry carries an
+idempotency key recorded in saved_reports within the same transaction, so
+an entry replayed after a crash or a failed flush is never saved twice.
+
+The journal's drained offset is kept in a sidecar ``.offset`` file, and the
+journal is truncated once everything in it has been delivered. The offset is
+reset before the journal is truncated, so a crash in between only replays
+entries (skipped by their keys) and never leaves the offset past the end.
+
+There is one journal per database (see journal_for) in ~/.echo_logbook.
+App instances using the same database share it, so journal and offset
+updates take an exclusive lock on a ``.lock`` file, and only one process
+drains the outbox at a time (``.flush.lock``).
+
+An entry the database can never accept (e.g. a column the schema lacks) is
+moved to a ``.failed`` journal instead of blocking every entry behind it.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+OUTBOX_DIR = os.path.join(os.path.expanduser('~'), '.echo_logbook')
+
+# SQLite result codes for a database that is busy or unreachable, as opposed
+# to an entry it will never accept: BUSY, LOCKED, IOERR, FULL, CANTOPEN, PROTOCOL
+RETRY_ERROR_CODES = frozenset({5, 6, 10, 13, 14, 15})
+
+
+def journal_for(db_file):
+    """Journal path for one database: entries don't record where they are
+    going, so app instances using different databases (or the same relative
+    name from another directory) must never share a journal"""
+    db_path = os.path.normcase(os.path.realpath(db_file))
+    digest = hashlib.sha256(db_path.encode('utf-8')).hexdigest()[:16]
+    return os.path.join(OUTBOX_DIR, f'outbox_{digest}.jsonl')
+
+
+def _is_transient(error):
+    """Whether a failed save is worth retrying later as it is"""
+    if isinstance(error, OSError):
+        return True
+    if isinstance(error, sqlite3.OperationalError):
+        code = getattr(error, 'sqlite_errorcode', None)
+        # sqlite_errorcode was added in Python 3.11; retry when unknown
+        return code is None or code & 0xff in RETRY_ERROR_CODES
+    return False
+
+
+@contextmanager
+def _file_lock(path, blocking=True):
+    """Exclusive inter-process lock on `path`; yields False if `blocking`
+    is off and another process holds it"""
+    with open(path, 'a+b') as lock_file:
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+        except OSError:
+            if blocking:
+                raise
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class Outbox:
+    def __init__(self, journal_path, fsync_interval=0.05):
+        self.journal_path = journal_path
+        self.offset_path = journal_path + '.offset'
+        self.lock_path = journal_path + '.lock'
+        self.flush_lock_path = journal_path + '.flush.lock'
+        self.failed_path = journal_path + '.failed'
+        self.fsync_interval = fsync_interval
+        os.makedirs(os.path.dirname(os.path.abspath(journal_path)), exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._journal = open(journal_path, 'ab')
+        self._dirty = False
+        self._closed = threading.Event()
+        self._syncer = threading.Thread(target=self._sync_loop, name='outbox-fsync', daemon=True)
+        self._syncer.start()
+
+    def append(self, report_data):
+        """Queue a report for saving; returns its idempotency key"""
+        key = uuid.uuid4().hex
+        line = json.dumps({'key': key, 'report': report_data}, separators=(',', ':'))
+        with self._lock, _file_lock(self.lock_path):
+            self._journal.write(line.encode('utf-8') + b'\n')
+            self._journal.flush()
+            self._dirty = True
+        return key
+
+    def sync(self):
+        """Force pending appends to disk"""
+        with self._lock:
+            if self._dirty:
+                os.fsync(self._journal.fileno())
+                self._dirty = False
+
+    def _sync_loop(self):
+        while not self._closed.wait(self.fsync_interval):
+            self.sync()
+
+    def pending(self, limit=None):
+        """Undelivered entries as [(key, report_data)] and the offset after them"""
+        with self._lock, _file_lock(self.lock_path):
+            offset = self._read_offset()
+            entries = []
+            with open(self.journal_path, 'rb') as journal:
+                if offset > 0:
+                    journal.seek(offset - 1)
+                    if journal.read(1) != b'\n':
+                        # Not a line boundary: a stale offset left by a crash
+                        # mid-truncate. Replays are skipped by their keys.
+                        offset = 0
+                journal.seek(offset)
+                for line in journal:
+                    if not line.endswith(b'\n'):
+                        # Torn final write from a crash; never acknowledged
+                        break
+                    entry = json.loads(line)
+                    entries.append((entry['key'], entry['report']))
+                    offset += len(line)
+                    if limit is not None and len(entries) >= limit:
+                        break
+            return entries, offset
+
+    def mark_delivered(self, offset):
+        """Record that everything before `offset` is in the database"""
+        with self._lock, _file_lock(self.lock_path):
+            if offset >= os.path.getsize(self.journal_path):
+                # Fully drained: start a fresh journal. Reset the offset
+                # first so a crash before the truncate only causes a replay.
+                self._write_offset(0)
+                self._journal.truncate(0)
+            else:
+                self._write_offset(offset)
+
+    def draining(self, blocking=False):
+        """Inter-process lock held while draining, so two app instances never
+        read the same entries and truncate each other's journal; yields False
+        if another process is already draining"""
+        return _file_lock(self.flush_lock_path, blocking)
+
+    def set_aside(self, key, report_data, error):
+        """Move an entry the database rejected to the failed journal"""
+        line = json.dumps({'key': key, 'report': report_data, 'error': str(error)},
+                          separators=(',', ':'))
+        with self._lock, _file_lock(self.lock_path):
+            # A replay after a crash rejects the same entry again
+            if key in self._failed_keys():
+                return
+            with open(self.failed_path, 'ab') as failed:
+                failed.write(line.encode('utf-8') + b'\n')
+                failed.flush()
+                os.fsync(failed.fileno())
+
+    def _failed_keys(self):
+        try:
+            with open(self.failed_path, 'rb') as failed:
+                return {json.loads(line)['key'] for line in failed if line.endswith(b'\n')}
+        except FileNotFoundError:
+            return set()
+
+    def pending_count(self):
+        return len(self.pending()[0])
+
+    def failed_count(self):
+        with self._lock, _file_lock(self.lock_path):
+            return len(self._failed_keys())
+
+    def _read_offset(self):
+        try:
+            with open(self.offset_path, 'r') as offset_file:
+                return int(offset_file.read() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def _write_offset(self, offset):
+        tmp_path = self.offset_path + '.tmp'
+        with open(tmp_path, 'w') as offset_file:
+            offset_file.write(str(offset))
+            offset_file.flush()
+            os.fsync(offset_file.fileno())
+        os.replace(tmp_path, self.offset_path)
+
+    def close(self):
+        self._closed.set()
+        self._syncer.join()
+        self.sync()
+        self._journal.close()
+
+
+class OutboxFlusher:
+    """Background thread that drains an Outbox into the database
+
+    `get_db` is called on every attempt so a database that could not be
+    opened earlier (e.g. the shared drive was offline) is retried.
+    `on_saved` receives {idempotency_key: report_id} after each batch.
+    """
+
+    def __init__(self, outbox, get_db, batch_size=500, interval=1.0,
+                 max_backoff=60.0, on_saved=None):
+        self.outbox = outbox
+        self.get_db = get_db
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_backoff = max_backoff
+        self.on_saved = on_saved
+        self.last_error = None
+
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='outbox-flusher', daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def notify(self):
+        """Flush as soon as possible, e.g. right after a save"""
+        self._wake.set()
+
+    def flush(self):
+        """Drain everything pending; returns the number of reports inserted"""
+        inserted = 0
+        with self.outbox.draining() as acquired:
+            if not acquired:
+                # Another app instance is draining the shared journal
+                return inserted
+            while True:
+                entries, offset = self.outbox.pending(self.batch_size)
+                if not entries:
+                    return inserted
+                self.outbox.sync()
+                saved = self._save(entries)
+                self.outbox.mark_delivered(offset)
+                inserted += len(saved)
+                if saved and self.on_saved is not None:
+                    self.on_saved(saved)
+
+    def _save(self, entries):
+        db = self.get_db()
+        try:
+            return db.save_reports(entries)
+        except Exception as e:
+            if _is_transient(e):
+                raise
+        # Some entry can never be saved: save the batch one entry at a time
+        # and set the rejected ones aside so they don't block the rest
+        saved = {}
+        for key, report_data in entries:
+            try:
+                saved.update(db.save_reports([(key, report_data)]))
+            except Exception as e:
+                if _is_transient(e):
+                    raise
+                self.outbox.set_aside(key, report_data, e)
+        return saved
+
+    def _run(self):
+        delay = self.interval
+        while not self._stopped.is_set():
+            try:
+                self.flush()
+                self.last_error = None
+                delay = self.interval
+            except Exception as e:
+                self.last_error = e
+                delay = min(delay * 2, self.max_backoff)
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def stop(self, timeout=5.0):
+        self._stopped.set()
+        self._wake.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
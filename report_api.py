@@ -0,0 +1,314 @@
+"""Local HTTP/JSON API over the echo report database
+
+Endpoints:
+    POST /reports                     save a report (JSON object of columns)
+    GET  /reports?q=&reporter=&start=&end=&limit=
+                                      search reports, newest first
+    GET  /reports/<id>?version=       one report, optionally at an earlier version
+    PATCH /reports/<id>               edit a report; body is
+                                      {"expected_version", "changes", "revised_by"}
+                                      (409 if it changed or is archived)
+    GET  /reports/<id>/history        revisions of a report
+    GET  /patients/<mrn>/reports      prior reports for one MRN
+    GET  /stats?start=&end=&target=   scans completed/remaining, pathology
+                                      summary and quality trends
+
+Database work runs in a bounded thread pool, each worker borrowing a
+connection from a ConnectionPool of the same size.
+
+Usage: python report_api.py [--db-file echo_reports.db] [--port 8765] [--pool-size 4]
+"""
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from db_manager import (ArchivedReportError, ConnectionPool, ConcurrentUpdateError,
+                        DatabaseManager, ReportNotFoundError)
+from report_model import REPORT_COLUMNS
+
+MAX_BODY_BYTES = 1024 * 1024
+SAVEABLE_COLUMNS = frozenset(REPORT_COLUMNS) - {'id', 'version'}
+
+
+class PooledDatabaseManager(DatabaseManager):
+    """DatabaseManager that borrows connections from a ConnectionPool"""
+
+    def __init__(self, db_file='echo_reports.db', pool_size=4):
+        self.pool = ConnectionPool(db_file, pool_size)
+        super().__init__(db_file)
+
+    @contextmanager
+    def _connection(self):
+        with self.pool.connection() as conn:
+            with conn:
+                yield conn
+
+    def close(self):
+        self.pool.close()
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class ReportAPI:
+    def __init__(self, db_file='echo_reports.db', pool_size=4):
+        self.db = PooledDatabaseManager(db_file, pool_size)
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='report-db')
+
+    async def run_db(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, lambda: func(*args, **kwargs))
+
+    async def dispatch(self, method, path, query, body):
+        parts = [unquote(part) for part in path.strip('/').split('/')]
+        if parts == ['reports']:
+            if method == 'POST':
+                return HTTPStatus.CREATED, await self.save_report(body)
+            if method == 'GET':
+                return HTTPStatus.OK, await self.search_reports(query)
+        elif len(parts) in (2, 3) and parts[0] == 'reports':
+            report_id = _int_segment(parts[1])
+            if len(parts) == 3 and parts[2] == 'history':
+                if method == 'GET':
+                    return HTTPStatus.OK, await self.get_report_history(report_id)
+            elif len(parts) == 2:
+                if method == 'GET':
+                    return HTTPStatus.OK, await self.get_report(report_id, query)
+                if method == 'PATCH':
+                    return HTTPStatus.OK, await self.update_report(report_id, body)
+            else:
+                raise HTTPError(HTTPStatus.NOT_FOUND, f"No route for {path}")
+        elif len(parts) == 3 and parts[0] == 'patients' and parts[2] == 'reports':
+            if method == 'GET':
+                return HTTPStatus.OK, await self.run_db(
+                    self.db.get_patient_reports, parts[1], _int_param(query, 'limit'))
+        elif parts == ['stats']:
+            if method == 'GET':
+                return HTTPStatus.OK, await self.get_stats(query)
+        else:
+            raise HTTPError(HTTPStatus.NOT_FOUND, f"No route for {path}")
+        raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} not allowed on {path}")
+
+    async def save_report(self, body):
+        try:
+            report_data = json.loads(body or b'null')
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be JSON")
+        if not isinstance(report_data, dict) or not report_data:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be a non-empty JSON object")
+        # Column names end up in the INSERT statement, so only accept known ones
+        unknown = sorted(set(report_data) - SAVEABLE_COLUMNS)
+        if unknown:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Unknown columns: {', '.join(unknown)}")
+        _check_scalars(report_data)
+        report_id = await self.run_db(self.db.save_report, report_data)
+        return {'id': report_id}
+
+    async def get_report(self, report_id, query):
+        try:
+            return await self.run_db(self.db.get_report, report_id, _int_param(query, 'version'))
+        except ReportNotFoundError as e:
+            raise HTTPError(HTTPStatus.NOT_FOUND, str(e))
+
+    async def get_report_history(self, report_id):
+        try:
+            return await self.run_db(self.db.get_report_history, report_id)
+        except ReportNotFoundError as e:
+            raise HTTPError(HTTPStatus.NOT_FOUND, str(e))
+
+    async def update_report(self, report_id, body):
+        try:
+            request = json.loads(body or b'null')
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be JSON")
+        if (not isinstance(request, dict) or not isinstance(request.get('changes'), dict)
+                or not isinstance(request.get('expected_version'), int)
+                or isinstance(request['expected_version'], bool)):
+            raise HTTPError(HTTPStatus.BAD_REQUEST,
+                            "Body must contain 'changes' (object) and 'expected_version' (integer)")
+        if not isinstance(request.get('revised_by'), (str, type(None))):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "revised_by must be a string")
+        _check_scalars(request['changes'])
+        try:
+            version = await self.run_db(
+                self.db.update_report, report_id, request['changes'],
+                request['expected_version'], request.get('revised_by'))
+        except ReportNotFoundError as e:
+            raise HTTPError(HTTPStatus.NOT_FOUND, str(e))
+        except (ConcurrentUpdateError, ArchivedReportError) as e:
+            raise HTTPError(HTTPStatus.CONFLICT, str(e))
+        except ValueError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(e))
+        return {'id': report_id, 'version': version}
+
+    async def search_reports(self, query):
+        return await self.run_db(
+            self.db.search_reports,
+            text=_param(query, 'q'),
+            reporter_name=_param(query, 'reporter'),
+            start_date=_date_param(query, 'start'),
+            end_date=_date_param(query, 'end'),
+            limit=_int_param(query, 'limit', 100))
+
+    async def get_stats(self, query):
+        start, end = _date_param(query, 'start'), _date_param(query, 'end')
+        target = _int_param(query, 'target', 75)
+        completed = await self.run_db(self.db.get_scans_completed, start, end)
+        return {
+            'scans_completed': completed,
+            'scans_remaining': max(0, target - completed),
+            'pathology_summary': await self.run_db(self.db.get_pathology_summary, start, end),
+            'quality_trends': [
+                {'month': month, 'scan_quality': quality, 'count': count}
+                for month, quality, count in await self.run_db(self.db.get_quality_trends, start, end)
+            ],
+        }
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self.respond(writer, HTTPStatus.BAD_REQUEST, {'error': "Malformed request line"}, False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get('content-length') or 0)
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    await self.respond(writer, HTTPStatus.BAD_REQUEST,
+                                       {'error': "Invalid Content-Length"}, False)
+                    break
+                if length > MAX_BODY_BYTES:
+                    await self.respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                       {'error': "Request body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                keep_alive = (headers.get('connection', '').lower() != 'close'
+                              and version == 'HTTP/1.1')
+                url = urlsplit(target)
+                try:
+                    status, payload = await self.dispatch(method, url.path, parse_qs(url.query), body)
+                except HTTPError as e:
+                    status, payload = e.status, {'error': e.message}
+                except Exception as e:
+                    status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)}
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive):
+        body = json.dumps(payload).encode('utf-8')
+        head = (
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+    async def serve(self, host='127.0.0.1', port=8765, ready=None):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.db.close()
+
+
+def _param(query, name, default=None):
+    values = query.get(name)
+    return values[0] if values else default
+
+
+def _int_segment(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"Invalid report id {value!r}")
+
+
+def _int_param(query, name, default=None):
+    value = _param(query, name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"{name} must be an integer")
+
+
+def _date_param(query, name):
+    """ISO date or date-time parameter, as a date or datetime"""
+    value = _param(query, name)
+    if value is None:
+        return None
+    try:
+        if len(value) == 10:
+            return date.fromisoformat(value)
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST,
+                        f"{name} must be an ISO date (YYYY-MM-DD) or date-time")
+
+
+def _check_scalars(values):
+    """Column values must be JSON scalars; SQLite cannot store arrays or objects"""
+    invalid = sorted(column for column, value in values.items()
+                     if not isinstance(value, (str, int, float, bool, type(None))))
+    if invalid:
+        raise HTTPError(HTTPStatus.BAD_REQUEST,
+                        f"Values must be strings, numbers, booleans or null: {', '.join(invalid)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON API for echo reports")
+    parser.add_argument('--db-file', default='echo_reports.db')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--pool-size', type=int, default=4)
+    args = parser.parse_args()
+
+    api = ReportAPI(args.db_file, args.pool_size)
+    print(f"Serving echo reports on http://{args.host}:{args.port}")
+    try:
+        asyncio.run(api.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        api.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+import sys
+
+# Columns of the reports table, in schema order
+REPORT_COLUMNS = (
+    'id', 'date_created',
+    'patient_name', 'mrn', 'dob', 'gender',
+    'scan_indication', 'scan_quality', 'quality_comments',
+    'view_psax', 'view_plax', 'view_a4c', 'view_a5c', 'view_subx',
+    'lv_size', 'lvidd', 'lv_function', 'wall_motion_abnormality',
+    'rv_size', 'rv_function', 'tapse',
+    'septum_shape',
+    'av_status', 'mv_status', 'tv_status',
+    'aortic_root', 'ivc', 'pericardial_fluid', 'pleural_effusion',
+    'additional_observations',
+    'clinical_conclusion', 'requires_level2', 'physician_informed',
+    'training_approval', 'reporter_name', 'training_status',
+    'version'
+)
+
+# Radio-button answers: a handful of distinct values repeated on every row
+CATEGORICAL_COLUMNS = frozenset((
+    'gender', 'scan_quality',
+    'lv_size', 'lv_function', 'rv_size', 'rv_function', 'septum_shape',
+    'av_status', 'mv_status', 'tv_status',
+    'aortic_root', 'ivc', 'pericardial_fluid', 'pleural_effusion',
+    'training_status'
+))
+
+BOOLEAN_COLUMNS = frozenset((
+    'view_psax', 'view_plax', 'view_a4c', 'view_a5c', 'view_subx',
+    'wall_motion_abnormality', 'requires_level2', 'physician_informed'
+))
+
+
+class Category:
+    """Interned value set for one categorical column
+
+    Every report holding the same answer shares a single string object, so a
+    categorical field costs one pointer per row however long its label is.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._values = {}
+
+    def encode(self, value):
+        if value is None:
+            return None
+        try:
+            return self._values[value]
+        except KeyError:
+            interned = self._values[value] = sys.intern(str(value))
+            return interned
+
+    def values(self):
+        return list(self._values)
+
+
+CATEGORIES = {column: Category(column) for column in CATEGORICAL_COLUMNS}
+
+
+class Report:
+    """Compact, slot-based record for a single echo report"""
+
+    # source_site is only set on reports read through a federated view
+    __slots__ = REPORT_COLUMNS + ('source_site',)
+
+    def __init__(self, **fields):
+        for column in REPORT_COLUMNS:
+            setattr(self, column, fields.get(column))
+        self.source_site = fields.get('source_site')
+
+    @classmethod
+    def from_values(cls, columns, values):
+        """Build a report from parallel column names and values, e.g. a database row"""
+        report = cls.__new__(cls)
+        for column in REPORT_COLUMNS:
+            setattr(report, column, None)
+        report.source_site = None
+        for column, value in zip(columns, values):
+            if column in CATEGORIES:
+                value = CATEGORIES[column].encode(value)
+            elif column in BOOLEAN_COLUMNS and value is not None:
+                value = bool(value)
+            setattr(report, column, value)
+        return report
+
+    def to_dict(self):
+        report = {column: getattr(self, column) for column in REPORT_COLUMNS}
+        if self.source_site is not None:
+            report['source_site'] = self.source_site
+        return report
+
+    def __eq__(self, other):
+        if not isinstance(other, Report):
+            return NotImplemented
+        return all(getattr(self, column) == getattr(other, column) for column in REPORT_COLUMNS)
+
+    def __repr__(self):
+        return f"Report(id={self.id!r}, date_created={self.date_created!r}, mrn={self.mrn!r})"
@@ -0,0 +1,202 @@
+"""Generic filtered queries over reports
+
+    query = (ReportQuery(db)
+             .between('date_created', '2024-01-01', '2025-01-01')
+             .where(scan_quality='Good', requires_level2=True)
+             .where_in('reporter_name', ['A Smith', 'B Jones']))
+    query.count()
+    reports, after = query.page(limit=50)
+    more, after = query.page(limit=50, after=after)
+    for report in query: ...
+
+Only columns in FILTER_COLUMNS can be filtered on, and values are always
+bound as parameters. The SQL text depends only on the shape of the query
+(which columns, which operators, how many IN values), never on the values,
+so repeated questions hit sqlite3's per-connection statement cache instead
+of being re-prepared on DatabaseManager's per-thread connections and on
+pooled ones.
+
+Results are ordered by (date_created, id), undated reports last, and paged
+by keyset: the next page starts after the last row's key, so deep pages cost
+the same as the first one, unlike OFFSET. Archive stores whose years the
+date_created range overlaps are read too, and every page is merged across
+stores by that order.
+"""
+import os
+from functools import lru_cache
+
+from db_manager import ARCHIVE_TEXT_COLUMNS, _timestamp
+from report_model import REPORT_COLUMNS
+
+# Archived free text is compressed, so it cannot be compared in SQL
+FILTER_COLUMNS = frozenset(REPORT_COLUMNS) - set(ARCHIVE_TEXT_COLUMNS)
+
+# Reports may be saved without a date. They sort after every dated report
+# instead of a NULL in the keyset comparison ending paging early. Matches the
+# idx_reports_created_key expression index.
+UNDATED = '9999-12-31 23:59:59'
+SORT_KEY = f"COALESCE(date_created, '{UNDATED}')"
+
+
+@lru_cache(maxsize=256)
+def _select_sql(source, shape, keyset, newest_first, select='*'):
+    """SELECT for a query shape: ((column, operator, value_count), ...)"""
+    conditions = []
+    for column, operator, count in shape:
+        if operator == 'IS NULL':
+            conditions.append(f"{column} IS NULL")
+        elif operator in ('IN', 'IN OR NULL'):
+            condition = f"{column} IN ({', '.join('?' * count)})" if count else ''
+            if operator == 'IN OR NULL':
+                condition = f"({condition} OR {column} IS NULL)" if count else f"{column} IS NULL"
+            conditions.append(condition)
+        elif column == 'date_created':
+            # Compare the sort key so one index serves the range and the order
+            conditions.append(f"{SORT_KEY} {operator} ?")
+            if operator in ('>', '>='):
+                conditions.append("date_created IS NOT NULL")
+        else:
+            conditions.append(f"{column} {operator} ?")
+    if keyset:
+        # The first term lets SQLite seek the index; the row value breaks ties on id
+        operator = '<' if newest_first else '>'
+        conditions.append(f"{SORT_KEY} {operator}= ? AND ({SORT_KEY}, id) {operator} (?, ?)")
+    sql = f"SELECT {select} FROM {source}"
+    if conditions:
+        sql += f" WHERE {' AND '.join(conditions)}"
+    if select == '*':
+        direction = 'DESC' if newest_first else 'ASC'
+        sql += f" ORDER BY {SORT_KEY} {direction}, id {direction} LIMIT ?"
+    return sql
+
+
+class ReportQuery:
+    """Immutable report query; each filter method returns a new query"""
+
+    def __init__(self, db, newest_first=False, as_records=False, _filters=()):
+        self.db = db
+        self.newest_first = newest_first
+        self.as_records = as_records
+        self._filters = _filters
+
+    def _add(self, column, operator, values):
+        if column not in FILTER_COLUMNS:
+            raise ValueError(f"Cannot filter on column: {column}")
+        return ReportQuery(self.db, self.newest_first, self.as_records,
+                           self._filters + ((column, operator, tuple(values)),))
+
+    def where(self, **equals):
+        """Columns equal to the given values; None matches NULL"""
+        query = self
+        for column, value in sorted(equals.items()):
+            if value is None:
+                query = query._add(column, 'IS NULL', ())
+            else:
+                query = query._add(column, '=', (value,))
+        return query
+
+    def where_in(self, column, values):
+        values = tuple(values)
+        if not values:
+            raise ValueError(f"where_in({column!r}) needs at least one value")
+        present = tuple(value for value in values if value is not None)
+        return self._add(column, 'IN OR NULL' if len(present) < len(values) else 'IN', present)
+
+    def between(self, column, start=None, end=None):
+        """column in [start, end); either bound may be None"""
+        query = self
+        if start is not None:
+            query = query._add(column, '>=', (_timestamp(start),))
+        if end is not None:
+            query = query._add(column, '<', (_timestamp(end),))
+        return query
+
+    def _shape_and_params(self):
+        shape = tuple((column, operator, len(values)) for column, operator, values in self._filters)
+        params = [value for _, _, values in self._filters for value in values]
+        return shape, params
+
+    def _date_range(self):
+        start = end = None
+        for column, operator, values in self._filters:
+            if column != 'date_created':
+                continue
+            if operator == '>=':
+                start = max(start, values[0]) if start is not None else values[0]
+            elif operator == '<':
+                end = min(end, values[0]) if end is not None else values[0]
+        return start, end
+
+    def _stores(self, conn):
+        """(schema name, archive path or None) for every store the range needs"""
+        start, end = self._date_range()
+        stores = [('archive', path) for path in self.db._archives_for_range(conn, start, end)
+                  if os.path.exists(path)]
+        return stores + [('main', None)]
+
+    def _each_store(self, conn):
+        for schema, path in self._stores(conn):
+            if path is not None:
+                conn.execute("ATTACH DATABASE ? AS archive", (path,))
+            try:
+                yield f"{schema}.reports"
+            finally:
+                if path is not None:
+                    conn.execute("DETACH DATABASE archive")
+
+    def _row_factory(self):
+        return self.db.report_row_factory if self.as_records else self.db._dict_row_factory
+
+    @staticmethod
+    def _key(report):
+        if isinstance(report, dict):
+            return report['date_created'] or UNDATED, report['id']
+        return report.date_created or UNDATED, report.id
+
+    def count(self):
+        shape, params = self._shape_and_params()
+        total = 0
+        with self.db._connection() as conn:
+            for source in self._each_store(conn):
+                sql = _select_sql(source, shape, False, False, 'COUNT(*)')
+                total += conn.execute(sql, params).fetchone()[0]
+        return total
+
+    def page(self, limit=100, after=None):
+        """One page of reports and the key to pass as `after` for the next
+        page (None when there are no more)
+
+        Each store is asked for its first limit + 1 rows after the key and
+        the results are merged by sort key: a report backdated after
+        archiving sits in the hot store among archived dates.
+        """
+        shape, params = self._shape_and_params()
+        keyset = [after[0], after[0], after[1]] if after is not None else []
+        reports = []
+        with self.db._connection() as conn:
+            for source in self._each_store(conn):
+                sql = _select_sql(source, shape, after is not None, self.newest_first)
+                cursor = conn.cursor()
+                cursor.row_factory = self._row_factory()
+                # One extra row tells us whether another page exists
+                reports.extend(cursor.execute(sql, params + keyset + [limit + 1]).fetchall())
+        reports.sort(key=self._key, reverse=self.newest_first)
+        if len(reports) > limit:
+            reports = reports[:limit]
+            return reports, self._key(reports[-1])
+        return reports, None
+
+    def iter_batches(self, batch_size=1000):
+        """Stream matching reports as lists of at most batch_size, one keyset
+        page at a time, so memory is bounded by batch_size per store"""
+        after = None
+        while True:
+            batch, after = self.page(batch_size, after)
+            if batch:
+                yield batch
+            if after is None:
+                return
+
+    def __iter__(self):
+        for batch in self.iter_batches():
+            yield from batch
@@ -53,5 +53,80 @@ CREATE TABLE IF NOT EXISTS reports (
     -- Training Details
     training_approval TEXT,
     reporter_name TEXT,
-    training_status TEXT
-);
\ No newline at end of file
+    training_status TEXT,
+
+    -- Incremented on every edit (optimistic concurrency)
+    version INTEGER NOT NULL DEFAULT 1
+);
+
+CREATE INDEX IF NOT EXISTS idx_reports_date_created ON reports (date_created);
+-- Sort key for report_query's keyset paging, which orders undated reports last
+CREATE INDEX IF NOT EXISTS idx_reports_created_key
+    ON reports (COALESCE(date_created, '9999-12-31 23:59:59'));
+CREATE INDEX IF NOT EXISTS idx_reports_mrn ON reports (mrn);
+CREATE INDEX IF NOT EXISTS idx_reports_reporter_name ON reports (reporter_name);
+
+-- Per-year archive databases holding reports moved out of the hot store
+CREATE TABLE IF NOT EXISTS archive_stores (
+    year INTEGER PRIMARY KEY,
+    db_file TEXT NOT NULL
+);
+
+-- Data-quality audit findings, one per report and rule
+CREATE TABLE IF NOT EXISTS audit_findings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    report_id INTEGER NOT NULL,
+    rule_name TEXT NOT NULL,
+    severity TEXT,
+    reporter_name TEXT,
+    detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (report_id, rule_name)
+);
+
+CREATE INDEX IF NOT EXISTS idx_audit_findings_reporter ON audit_findings (reporter_name, rule_name);
+
+-- Highest report id each audit rule has been evaluated against, and the rule
+-- itself so an edited report can be re-checked in the edit's transaction
+CREATE TABLE IF NOT EXISTS audit_state (
+    rule_name TEXT PRIMARY KEY,
+    last_report_id INTEGER NOT NULL,
+    severity TEXT,
+    condition TEXT
+);
+
+-- Idempotency keys of reports delivered through the offline outbox
+CREATE TABLE IF NOT EXISTS saved_reports (
+    idempotency_key TEXT PRIMARY KEY,
+    report_id INTEGER
+);
+
+-- Edit history: for each version, the previous values of the columns it changed
+CREATE TABLE IF NOT EXISTS report_revisions (
+    report_id INTEGER NOT NULL,
+    version INTEGER NOT NULL,
+    revised_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    revised_by TEXT,
+    previous_values TEXT NOT NULL,
+    PRIMARY KEY (report_id, version)
+) WITHOUT ROWID;
+
+-- Possible duplicate patients found by dedup.py, awaiting review
+CREATE TABLE IF NOT EXISTS patient_merge_suggestions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    keep_name TEXT,
+    keep_mrn TEXT,
+    keep_dob TEXT,
+    merge_name TEXT,
+    merge_mrn TEXT,
+    merge_dob TEXT,
+    score REAL NOT NULL,
+    reasons TEXT,
+    status TEXT NOT NULL DEFAULT 'pending',
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- The two identities in a fixed order, so a pair is stored (and
+    -- dismissed) once whichever side is kept
+    pair_key TEXT
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_merge_suggestions_pair
+    ON patient_merge_suggestions (pair_key);
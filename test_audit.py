@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+from audit import AuditEngine, AuditRule
+from db_manager import DatabaseManager
+
+NO_REPORTER = AuditRule('no_reporter', "COALESCE(reporter_name, '') = ''")
+
+
+class AuditEngineTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp_dir.cleanup)
+        self.db = DatabaseManager(os.path.join(self._tmp_dir.name, 'reports.db'))
+        self.addCleanup(self.db.close)
+        self.anonymous = self.db.save_report({'scan_quality': 'Good'})
+        self.signed = self.db.save_report({'scan_quality': 'Poor', 'reporter_name': 'A Smith'})
+
+    def findings(self):
+        return [(finding['report_id'], finding['rule_name'], finding['severity'])
+                for finding in AuditEngine(self.db, []).get_findings()]
+
+    def test_removed_rule_findings_are_deleted(self):
+        AuditEngine(self.db, [NO_REPORTER]).run()
+        self.assertEqual(self.findings(), [(self.anonymous, 'no_reporter', 'warning')])
+
+        AuditEngine(self.db, []).run()
+        self.assertEqual(self.findings(), [])
+        # Nor is the removed rule applied to edits
+        self.db.update_report(self.signed, {'reporter_name': None}, 1)
+        self.assertEqual(self.findings(), [])
+
+    def test_changed_condition_is_rerun_over_every_report(self):
+        AuditEngine(self.db, [NO_REPORTER]).run()
+        poor = AuditRule('no_reporter', "scan_quality = 'Poor'", severity='error')
+        AuditEngine(self.db, [poor]).run()
+        self.assertEqual(self.findings(), [(self.signed, 'no_reporter', 'error')])
+
+        # Edits are re-checked with the new condition
+        self.db.update_report(self.anonymous, {'scan_quality': 'Poor'}, 1)
+        self.assertEqual(self.findings(), [(self.anonymous, 'no_reporter', 'error'),
+                                           (self.signed, 'no_reporter', 'error')])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import tempfile
+import unittest
+
+from db_manager import DatabaseManager
+from dedup import DuplicateFinder, pair_key
+
+SMITH = ('John Smith', '1234567', '01/02/1980')
+SMITH_TYPO = ('Jon Smith', '1234576', '01/02/1980')
+JONES = ('Ann Jones', '7654321', '03/04/1975')
+
+
+class DuplicateFinderTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp_dir.cleanup)
+        self.db = DatabaseManager(os.path.join(self._tmp_dir.name, 'reports.db'))
+        self.addCleanup(self.db.close)
+        self.finder = DuplicateFinder(self.db)
+
+    def save(self, identity, count=1):
+        for _ in range(count):
+            name, mrn, dob = identity
+            self.db.save_report({'patient_name': name, 'mrn': mrn, 'dob': dob})
+
+    def suggest(self, keep, merge):
+        with self.db._connection() as conn:
+            cursor = conn.execute(
+                "INSERT INTO patient_merge_suggestions (keep_name, keep_mrn, keep_dob, "
+                "merge_name, merge_mrn, merge_dob, score, pair_key) VALUES (?, ?, ?, ?, ?, ?, 0.9, ?)",
+                keep + merge + (pair_key(keep, merge),))
+            conn.commit()
+            return cursor.lastrowid
+
+    def pending(self):
+        return [((row['keep_name'], row['keep_mrn'], row['keep_dob']),
+                 (row['merge_name'], row['merge_mrn'], row['merge_dob']))
+                for row in self.finder.pending_suggestions()]
+
+    def test_dismissed_pair_stays_dismissed_when_found_reversed(self):
+        self.save(SMITH)
+        self.save(SMITH_TYPO, 2)
+        self.assertEqual(self.finder.refresh_suggestions(), 1)
+        self.assertEqual(self.pending(), [(SMITH_TYPO, SMITH)])
+        self.finder.dismiss(self.finder.pending_suggestions()[0]['id'])
+
+        # Now SMITH has more reports, so the pair is found the other way round
+        self.save(SMITH, 2)
+        self.assertEqual(self.finder.refresh_suggestions(), 0)
+        self.assertEqual(self.pending(), [])
+
+    def test_merge_repoints_pending_suggestions(self):
+        self.save(SMITH, 2)
+        self.save(SMITH_TYPO)
+        merged = self.suggest(SMITH, SMITH_TYPO)
+        self.suggest(JONES, SMITH_TYPO)
+
+        self.finder.merge(merged)
+        self.assertEqual(self.pending(), [(SMITH, JONES)])
+
+
+if __name__ == '__main__':
+    unittest.main()
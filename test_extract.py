@@ -0,0 +1,36 @@
+import os
+import tempfile
+import unittest
+
+from db_manager import DatabaseManager
+from extract import (MAX_DATE_SHIFT_DAYS, OUTPUT_COLUMNS, REDACTED, date_shift,
+                     previous_identities, pseudonymize_batch)
+
+KEY = b'0123456789abcdef'
+
+
+class ExtractTest(unittest.TestCase):
+    def test_date_shift_is_bounded_and_never_zero(self):
+        shifts = {date_shift(KEY, f"patient {index}").days for index in range(5000)}
+        self.assertEqual(min(shifts), -MAX_DATE_SHIFT_DAYS)
+        self.assertEqual(max(shifts), MAX_DATE_SHIFT_DAYS)
+        self.assertNotIn(0, shifts)
+
+    def test_earlier_identity_is_scrubbed(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        db = DatabaseManager(os.path.join(tmp_dir.name, 'reports.db'))
+        self.addCleanup(db.close)
+        report_id = db.save_report({
+            'patient_name': 'Jon Smyth', 'mrn': '1234576',
+            'clinical_conclusion': 'Smyth 1234576 reviewed, normal LV'})
+        db.update_report(report_id, {'patient_name': 'John Smith', 'mrn': '1234567'}, 1)
+
+        batch = next(db.iter_report_batches())
+        [row] = pseudonymize_batch(previous_identities(db, batch), KEY)
+        conclusion = row[OUTPUT_COLUMNS.index('clinical_conclusion')]
+        self.assertEqual(conclusion, f'{REDACTED} {REDACTED} reviewed, normal LV')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from db_manager import DatabaseManager
+from outbox import Outbox, OutboxFlusher, journal_for
+
+
+class SimulatedCrash(Exception):
+    pass
+
+
+class OutboxTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp_dir.cleanup)
+        self.journal_path = os.path.join(self._tmp_dir.name, 'outbox.jsonl')
+        self.db = DatabaseManager(os.path.join(self._tmp_dir.name, 'reports.db'))
+        self.addCleanup(self.db.close)
+
+    def open_outbox(self):
+        outbox = Outbox(self.journal_path)
+        self.addCleanup(outbox.close)
+        return outbox
+
+    def report_count(self):
+        return self.db.get_scans_completed()
+
+    def test_crash_between_offset_reset_and_truncate(self):
+        outbox = self.open_outbox()
+        for index in range(3):
+            outbox.append({'patient_name': f"Patient {index}"})
+        entries, offset = outbox.pending()
+        self.db.save_reports(entries)
+
+        def crash(*args):
+            raise SimulatedCrash()
+        outbox._journal.truncate = crash
+        with self.assertRaises(SimulatedCrash):
+            outbox.mark_delivered(offset)
+        outbox.close()
+
+        # After a restart the delivered entries are replayed, then skipped
+        restarted = self.open_outbox()
+        restarted.append({'patient_name': "Saved after restart"})
+        entries, _ = restarted.pending()
+        self.assertEqual([report['patient_name'] for _, report in entries],
+                         ["Patient 0", "Patient 1", "Patient 2", "Saved after restart"])
+        self.assertEqual(OutboxFlusher(restarted, lambda: self.db).flush(), 1)
+        self.assertEqual(self.report_count(), 4)
+        self.assertEqual(restarted.pending_count(), 0)
+
+    def test_stale_offset_past_end_of_journal(self):
+        outbox = self.open_outbox()
+        outbox.append({'patient_name': "Delivered"})
+        _, offset = outbox.pending()
+        # Journal truncated but the old offset survived, as before the fix
+        outbox._journal.truncate(0)
+        outbox._write_offset(offset)
+
+        outbox.append({'patient_name': "New"})
+        outbox.append({'patient_name': "Newer, longer than the stale offset"})
+        entries, _ = outbox.pending()
+        self.assertEqual([report['patient_name'] for _, report in entries],
+                         ["New", "Newer, longer than the stale offset"])
+
+    def test_replay_with_same_keys_saves_once(self):
+        outbox = self.open_outbox()
+        keys = [outbox.append({'patient_name': f"Patient {index}"}) for index in range(5)]
+        entries, _ = outbox.pending()
+
+        saved = self.db.save_reports(entries)
+        self.assertEqual(sorted(saved), sorted(keys))
+        self.assertEqual(self.db.save_reports(entries), {})
+        self.assertEqual(self.report_count(), 5)
+
+    def test_only_one_process_drains_at_a_time(self):
+        outbox = self.open_outbox()
+        outbox.append({'patient_name': "Patient"})
+        with outbox.draining() as acquired:
+            self.assertTrue(acquired)
+            # Another instance sharing the journal backs off
+            self.assertEqual(OutboxFlusher(self.open_outbox(), lambda: self.db).flush(), 0)
+        self.assertEqual(OutboxFlusher(outbox, lambda: self.db).flush(), 1)
+
+    def test_rejected_entry_does_not_block_later_ones(self):
+        outbox = self.open_outbox()
+        outbox.append({'patient_name': "Before"})
+        outbox.append({'no_such_column': "x"})
+        outbox.append({'patient_name': "After"})
+        flusher = OutboxFlusher(outbox, lambda: self.db)
+        self.assertEqual(flusher.flush(), 2)
+        self.assertEqual(self.report_count(), 2)
+        self.assertEqual(outbox.pending_count(), 0)
+        self.assertEqual(outbox.failed_count(), 1)
+
+    def test_unreachable_database_keeps_entries_pending(self):
+        outbox = self.open_outbox()
+        outbox.append({'patient_name': "Patient"})
+        offline = DatabaseManager(os.path.join(self._tmp_dir.name, 'reports.db'))
+        self.addCleanup(offline.close)
+        offline.db_file = os.path.join(self._tmp_dir.name, 'missing', 'reports.db')
+        offline.close()
+        with self.assertRaises(sqlite3.OperationalError):
+            OutboxFlusher(outbox, lambda: offline).flush()
+        self.assertEqual(outbox.pending_count(), 1)
+        self.assertEqual(outbox.failed_count(), 0)
+
+    def test_journal_per_database(self):
+        db_file = os.path.join(self._tmp_dir.name, 'reports.db')
+        cwd = os.getcwd()
+        self.addCleanup(os.chdir, cwd)
+        os.chdir(self._tmp_dir.name)
+        self.assertEqual(journal_for('reports.db'), journal_for(db_file))
+        self.assertNotEqual(journal_for(db_file),
+                            journal_for(os.path.join(self._tmp_dir.name, 'other.db')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from http import HTTPStatus
+
+from report_api import HTTPError, ReportAPI
+
+
+class ReportAPITest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp_dir.cleanup)
+        self.api = ReportAPI(os.path.join(self._tmp_dir.name, 'reports.db'), pool_size=1)
+        self.addCleanup(self.api.close)
+
+    def dispatch(self, method, path, query=None, body=b''):
+        return asyncio.run(self.api.dispatch(method, path, query or {}, body))
+
+    def assertBadRequest(self, *args):
+        with self.assertRaises(HTTPError) as raised:
+            self.dispatch(*args)
+        self.assertEqual(raised.exception.status, HTTPStatus.BAD_REQUEST)
+
+    def test_invalid_dates_are_rejected(self):
+        self.assertBadRequest('GET', '/stats', {'start': ['foo']})
+        self.assertBadRequest('GET', '/reports', {'end': ['2024-13-01']})
+        status, _ = self.dispatch('GET', '/stats', {'start': ['2024-01-01'],
+                                                    'end': ['2025-01-01T00:00:00']})
+        self.assertEqual(status, HTTPStatus.OK)
+
+    def test_non_scalar_values_are_rejected(self):
+        self.assertBadRequest('POST', '/reports', None, b'{"mrn": ["123"]}')
+        _, saved = self.dispatch('POST', '/reports', None, b'{"mrn": "123"}')
+        self.assertBadRequest('PATCH', f"/reports/{saved['id']}", None,
+                              b'{"expected_version": 1, "changes": {"mrn": {"a": 1}}}')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import os
+import tempfile
+import unittest
+
+from db_manager import DatabaseManager
+from report_query import ReportQuery
+
+
+class ReportQueryTest(unittest.TestCase):
+    def setUp(self):
+        self._tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp_dir.cleanup)
+        self.db = DatabaseManager(os.path.join(self._tmp_dir.name, 'reports.db'))
+        self.addCleanup(self.db.close)
+
+    def save(self, date_created, **fields):
+        return self.db.save_report({'date_created': date_created, **fields})
+
+    def pages(self, query, limit):
+        ids, after = [], None
+        while True:
+            reports, after = query.page(limit, after)
+            ids += [report['id'] for report in reports]
+            if after is None:
+                return ids
+
+    def test_backdated_hot_report_is_merged_across_stores(self):
+        archived = [self.save(f'{year}-06-01 10:00:00') for year in (2021, 2022, 2023)]
+        recent = self.save('2025-03-01 10:00:00')
+        self.db.archive_reports('2024-01-01')
+        # Saved after archiving, so it lives in the hot store
+        backdated = self.save('2020-02-01 10:00:00')
+        undated = self.save(None)
+
+        expected = [backdated] + archived + [recent, undated]
+        query = ReportQuery(self.db)
+        self.assertEqual([report['id'] for report in query], expected)
+        for limit in (1, 2, 3, 10):
+            self.assertEqual(self.pages(query, limit), expected)
+        self.assertEqual(self.pages(ReportQuery(self.db, newest_first=True), 3), expected[::-1])
+        self.assertEqual(query.count(), len(expected))
+
+    def test_none_matches_null(self):
+        with_mrn = self.save('2024-01-01', mrn='123')
+        without_mrn = self.save('2024-01-02')
+        self.assertEqual([report['id'] for report in ReportQuery(self.db).where(mrn=None)],
+                         [without_mrn])
+        self.assertEqual(self.pages(ReportQuery(self.db).where_in('mrn', ['123', None]), 1),
+                         [with_mrn, without_mrn])
+
+    def test_unknown_column_is_rejected(self):
+        with self.assertRaises(ValueError):
+            ReportQuery(self.db).where(**{'id = 1 OR 1': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+"""Qt event-loop stall detection
+
+A QTimer on the GUI thread records a heartbeat every `interval_ms`. A
+separate Python thread watches the heartbeat; when it is older than
+`threshold_ms` the event loop is blocked, and the watchdog grabs the GUI
+thread's current Python stack via sys._current_frames(). The sample is
+completed with the full stall duration once the loop runs again.
+"""
+import sys
+import threading
+import time
+import traceback
+
+from PyQt6.QtCore import QTimer
+
+
+class Stall:
+    __slots__ = ('started', 'duration_ms', 'stack')
+
+    def __init__(self, started, stack):
+        self.started = started
+        self.duration_ms = None
+        self.stack = stack
+
+    def __repr__(self):
+        return f"Stall(duration_ms={self.duration_ms!r})"
+
+
+class StallWatchdog:
+    def __init__(self, threshold_ms=200.0, interval_ms=20, on_stall=None):
+        self.threshold = threshold_ms / 1000
+        self.interval_ms = interval_ms
+        self.on_stall = on_stall
+        self.stalls = []
+
+        self._gui_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._current = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._timer = QTimer()
+        self._timer.timeout.connect(self._beat)
+        self._monitor = threading.Thread(target=self._watch, name='stall-watchdog', daemon=True)
+
+    def start(self):
+        """Start watching; must be called from the GUI thread"""
+        self._gui_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._timer.start(self.interval_ms)
+        self._monitor.start()
+        return self
+
+    def stop(self):
+        self._timer.stop()
+        self._stopped.set()
+        if self._monitor.is_alive():
+            self._monitor.join()
+
+    def _beat(self):
+        now = time.monotonic()
+        with self._lock:
+            stall, self._current = self._current, None
+            self._heartbeat = now
+        if stall is not None:
+            stall.duration_ms = (now - stall.started) * 1000
+            if self.on_stall is not None:
+                self.on_stall(stall)
+
+    def _watch(self):
+        # Check a few times per threshold so the sample lands inside the stall
+        poll = min(self.threshold / 4, self.interval_ms / 1000)
+        while not self._stopped.wait(poll):
+            with self._lock:
+                if self._current is not None:
+                    continue
+                # The timer fires every interval, so only time beyond that counts
+                started = self._heartbeat + self.interval_ms / 1000
+                if time.monotonic() - started < self.threshold:
+                    continue
+                frame = sys._current_frames().get(self._gui_thread_id)
+                stack = ''.join(traceback.format_stack(frame)) if frame is not None else ''
+                self._current = Stall(started, stack)
+                self.stalls.append(self._current)
+
+    @staticmethod
+    def print_stall(stall):
+        print(f"\nEvent loop stalled for {stall.duration_ms:.0f} ms; GUI thread was in:\n{stall.stack}")